@@ -4,7 +4,8 @@ C = A .* B;
 print(C);
 
 D = zeros(4);
-D[0, 0] = 42;
-# D[1:3, 2:4] = 7;
-# print D;
-# print D[2, 2];
+D[0, 0] = 42.0;
+D[1:3, 2:4] = 7.0;
+print(D);
+x = D[2, 2];
+print(x);
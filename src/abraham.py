@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Literal, Optional
 
 Operator = Literal[
@@ -21,6 +21,12 @@ Operator = Literal[
     "SUBSCRIPT",
     ]
 
+# Filled in by the Resolver: (frame depth, slot index) of a variable, or None if it's never declared.
+Slot = Optional[tuple[int, int]]
+
+def annotation():
+    return field(default=None, kw_only=True, repr=False, compare=False)
+
 AssignOperator = Literal[
     "ASSIGN",
     "PLUS_ASSIGN",
@@ -33,7 +39,10 @@ class Abraham:
 
     @dataclass
     class Node:
-        pass
+        # Filled in by the TypeChecker: the Symbol inferred for this node, None for statements
+        symbol: Optional['Symbol'] = annotation()
+        # Filled in by the parser: the source line the node starts on, None for generated nodes
+        lineno: Optional[int] = annotation()
 
     @dataclass
     class Statement(Node):
@@ -56,23 +65,30 @@ class Abraham:
         left: 'Abraham.Expression'
         right: 'Abraham.Expression'
         operator: AssignOperator
+        # Filled in by BoundsChecks: a hidden variable that is true while the indices of this
+        # element assignment are known to be in bounds, see bounds.py
+        in_bounds: Optional['Abraham.Identifier'] = annotation()
 
     @dataclass
     class If(Statement):
         condition: 'Abraham.Expression'
         block: 'Abraham.StatementList'
         else_block: Optional['Abraham.StatementList']
+        frame: Optional['FrameLayout'] = annotation()
     
     @dataclass
     class While(Statement):
         condition: 'Abraham.Expression'
         block: 'Abraham.StatementList'
+        frame: Optional['FrameLayout'] = annotation()
 
     @dataclass
     class For(Statement):
         iterator: 'Abraham.Identifier'
         range: 'Abraham.Expression'
         block: 'Abraham.StatementList'
+        frame: Optional['FrameLayout'] = annotation()
+        iterator_slot: Slot = annotation()
 
     @dataclass
     class Return(Statement):
@@ -89,6 +105,7 @@ class Abraham:
     @dataclass
     class Identifier(Expression):
         name: str
+        slot: Slot = annotation()
 
     @dataclass
     class Numericek(Expression):
@@ -98,6 +115,29 @@ class Abraham:
     class String(Expression):
         value: str
 
+    # Made by the Optimizer: a value computed ahead of time, a scalar or an array. Arrays are
+    # copied every time the node is evaluated, the program never shares them.
+    @dataclass
+    class Constant(Expression):
+        value: object
+
+    # Made by CodeMotion: evaluates `value` and keeps the result in the hidden variable `name`.
+    # A lazy one only evaluates while the variable is still None and otherwise reads it.
+    @dataclass
+    class Memo(Expression):
+        name: str
+        value: 'Abraham.Expression'
+        lazy: bool
+        slot: Slot = annotation()
+
+    # Made by the Fuser: `expression`, a tree of elementwise operations, run by `kernel` (see
+    # fusion.py) over the values of `operands`, its other subexpressions in evaluation order
+    @dataclass
+    class Fused(Expression):
+        operands: list['Abraham.Expression']
+        kernel: 'Kernel'
+        expression: 'Abraham.Expression'
+
     @dataclass
     class Vector(Expression):
         content: 'Abraham.ExpressionList'
@@ -116,6 +156,8 @@ class Abraham:
         left: 'Abraham.Expression'
         right: 'Abraham.Expression'
         operator: Operator
+        # Filled in by the Interpreter the first time the node runs, see inline_cache.py
+        inline_cache: Optional['InlineCache'] = annotation()
 
     @dataclass
     class UnaryOp(Expression):
@@ -0,0 +1,80 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+from pathlib import Path
+
+# Modules whose code decides what the checked AST looks like. Their contents make up the
+# compiler version, so editing any of them invalidates every cached entry.
+FRONTEND_MODULES = [
+    "abraham.py", "lech.py", "patryk.py", "parser_cache.py", "symbol_table.py", "type_checker.py", "visitor.py",
+    "ast_cache.py",
+]
+
+DEFAULT_DIRECTORY = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "matlab_compiler"
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+def compiler_version():
+    digest = hashlib.sha256()
+    source_directory = Path(__file__).parent
+    for module in FRONTEND_MODULES:
+        digest.update((source_directory / module).read_bytes())
+    return digest.hexdigest()
+
+
+# Type-checked ASTs on disk as zlib-compressed pickles, keyed on the source text and the
+# compiler version. The least recently used entries go past max_size, and any problem with
+# the directory just turns the cache off.
+class AstCache:
+
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self.directory = Path(directory or os.environ.get("MATLAB_COMPILER_CACHE", DEFAULT_DIRECTORY))
+        self.max_size = max_size
+        self.version = compiler_version()
+
+    def path(self, text):
+        key = hashlib.sha256(self.version.encode() + b"\0" + text.encode()).hexdigest()
+        return self.directory / f"{key}.ast"
+
+    def load(self, text):
+        path = self.path(text)
+        try:
+            data = path.read_bytes()
+            ast = pickle.loads(zlib.decompress(data))
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, zlib.error, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            # A broken entry is dropped, the source is simply compiled again
+            path.unlink(missing_ok=True)
+            return None
+        return ast
+
+    def store(self, text, ast):
+        try:
+            data = zlib.compress(pickle.dumps(ast, protocol=pickle.HIGHEST_PROTOCOL))
+            self.directory.mkdir(parents=True, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(descriptor, "wb") as cache_file:
+                cache_file.write(data)
+            os.replace(temporary, self.path(text))
+            self.evict()
+        except (OSError, RecursionError):
+            pass
+
+    def evict(self):
+        entries = []
+        for path in self.directory.glob("*.ast"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
@@ -0,0 +1,238 @@
+import contextlib
+import io
+import json
+import platform
+import statistics
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from pathlib import Path
+from time import perf_counter
+from lech import Lech
+from patryk import Patryk
+from type_checker import TypeChecker
+from kniaz_jarema import ENGINES
+
+RESOURCES = Path(__file__).parent.parent / "resources"
+
+# Differences below this many seconds are noise, never regressions
+NOISE_FLOOR = 0.005
+
+# ====== Workloads ======
+
+def synthetic_program(statements):
+    # A mix of assignments, arithmetic, blocks and control flow, cycled to the requested length.
+    # The program type checks and runs, so it can go through every phase.
+    header = "y = 0.0;\nz = 0.0;\nA = zeros(10);\n"
+    templates = [
+        "x{n} = {n}.0;",
+        "y = x{n} .+ 0.5 .* (y .- x{n});",
+        "if (y > {n}.0) {{ z = y; }} else {{ z = -y; }}",
+        "A[{row}, 1] += 1.0;",
+        "while (z > y) {{ z = y; }}",
+    ]
+    body = (templates[i % len(templates)].format(n=i // len(templates), row=i % 10) for i in range(statements))
+    return header + "\n".join(body)
+
+def counted_loop(iterations):
+    return f"s = 0.0;\nfor (i = 1:{iterations}) {{\n    s += 1.5;\n}}\nprint(s);\n"
+
+def control_flow(iterations):
+    # A continue on every iteration and an inner loop that always ends in a break
+    return (f"s = 0;\nfor (i = 1:{iterations}) {{\n"
+            "    for (j = 1:10) {\n        if (j == 2) { break; }\n        s += 1;\n    }\n"
+            "    if (i > 0) { continue; }\n    s -= 1;\n}\nprint(s);\n")
+
+SYNTHETIC = {
+    "synthetic/statements-1000": lambda: synthetic_program(1_000),
+    "synthetic/statements-10000": lambda: synthetic_program(10_000),
+    "synthetic/loop-100000": lambda: counted_loop(100_000),
+    "synthetic/control-50000": lambda: control_flow(50_000),
+}
+
+def workloads(selected):
+    found = {}
+    for directory in ("programs", "examples"):
+        for path in sorted((RESOURCES / directory).glob("*.m")):
+            found[f"{directory}/{path.name}"] = path.read_text
+    found.update(SYNTHETIC)
+    return {name: source for name, source in found.items()
+            if not selected or any(pattern in name for pattern in selected)}
+
+# ====== Measurements ======
+
+def measure(run, repeat, memory):
+    # The last result of repeat calls and their timings, the phase's output is swallowed. Peak
+    # memory comes from one more run, tracemalloc is too slow to time under.
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = perf_counter()
+            result = run()
+            timings.append(perf_counter() - start)
+        peak = None
+        if memory:
+            tracemalloc.start()
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    median = statistics.median(timings)
+    return result, {
+        "runs": timings,
+        "best": min(timings),
+        "median": median,
+        "per_second": 1 / median if median > 0 else None,
+        "peak_memory": peak,
+    }
+
+def benchmark(name, text, engine, repeat, memory):
+    def interpret(ast):
+        try:
+            ENGINES[engine]().interpret(ast)
+        except SystemExit:
+            # Runtime errors end the program through exit(), that's still a finished run
+            pass
+
+    phases = [
+        ("lex", lambda _: list(Lech().tokenize(text))),
+        ("parse", lambda tokens: Patryk().get_ast(iter(tokens))),
+        ("check", lambda ast: (ast, TypeChecker().check(ast))),
+        ("interpret", interpret),
+    ]
+
+    results = []
+    value = None
+    for phase, run in phases:
+        result = {"workload": name, "phase": phase}
+        results.append(result)
+        try:
+            value, timings = measure(lambda: run(value), repeat, memory)
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+            break
+        result.update(timings)
+        if phase == "check":
+            value, errors = value
+            if errors:
+                # The interpreter is only ever given programs that type check
+                result["error"] = f"{errors} type errors"
+                break
+    return results
+
+def run_suite(arguments):
+    results = []
+    for name, source in workloads(arguments.workloads).items():
+        workload_results = benchmark(name, source(), arguments.engine, arguments.repeat, not arguments.no_memory)
+        print_results(workload_results)
+        results += workload_results
+    return {
+        "python": platform.python_version(),
+        "engine": arguments.engine,
+        "repeat": arguments.repeat,
+        "results": results,
+    }
+
+# ====== Reporting ======
+
+def print_results(results):
+    for result in results:
+        name = result["workload"]
+        if "median" not in result:
+            print(f"{name:<32} {result['phase']:<10} {result['error']}")
+            continue
+        peak = result["peak_memory"]
+        peak = f"{peak / 1024 / 1024:9.2f} MiB" if peak is not None else ""
+        print(f"{name:<32} {result['phase']:<10} {result['median'] * 1000:10.2f} ms "
+              f"{result['per_second']:10.2f}/s {peak}")
+        if "error" in result:
+            print(f"{name:<32} {result['phase']:<10} {result['error']}")
+
+def compare(report, baseline, threshold):
+    # The (workload, phase) pairs whose median got slower than the baseline's by more than
+    # threshold (0.1 is 10%)
+    previous = {(result["workload"], result["phase"]): result
+                for result in baseline["results"] if "median" in result}
+    regressions = []
+    for result in report["results"]:
+        old = previous.get((result["workload"], result["phase"]))
+        if old is None or "median" not in result:
+            continue
+        ratio = result["median"] / old["median"] if old["median"] > 0 else 1.0
+        if ratio > 1 + threshold and result["median"] - old["median"] > NOISE_FLOOR:
+            regressions.append((result["workload"], result["phase"], old["median"], result["median"], ratio))
+    return regressions
+
+def print_comparison(regressions, threshold):
+    if not regressions:
+        print(f"\nNo regressions over {threshold:.0%} against the baseline.")
+        return
+    print(f"\nRegressions over {threshold:.0%} against the baseline:")
+    for workload, phase, old, new, ratio in regressions:
+        print(f"{workload:<32} {phase:<10} {old * 1000:10.2f} ms -> {new * 1000:10.2f} ms ({ratio:.2f}x)")
+
+def parse_scaling(sizes):
+    results = []
+    for size in sizes:
+        text = synthetic_program(size)
+        start = perf_counter()
+        Patryk().get_ast(Lech().tokenize(text))
+        results.append((size, perf_counter() - start))
+    return results
+
+def report_parse_scaling(results):
+    print(f"{'statements':>12} {'seconds':>10} {'us/statement':>14} {'growth':>8}")
+    previous = None
+    for size, elapsed in results:
+        per_statement = elapsed / size * 1e6
+        # Time per statement should stay flat when parsing is linear
+        growth = f"{per_statement / previous:.2f}x" if previous else ""
+        print(f"{size:>12} {elapsed:>10.3f} {per_statement:>14.2f} {growth:>8}")
+        previous = per_statement
+
+# ====== Command line ======
+
+def parse_arguments():
+    parser = ArgumentParser(description="Benchmarks for the lexer, parser, type checker and engines")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    suite = commands.add_parser("suite", help="time every phase on resources/ and the synthetic workloads")
+    suite.add_argument("workloads", nargs="*",
+                       help="only run workloads whose name contains one of these strings")
+    suite.add_argument("--engine", choices=ENGINES.keys(), default="interpreter",
+                       help="engine used for the interpret phase (default: interpreter)")
+    suite.add_argument("--repeat", type=int, default=3, help="timed runs per phase (default: 3)")
+    suite.add_argument("--no-memory", action="store_true", help="skip the peak memory measurement")
+    suite.add_argument("--output", metavar="FILE", help="write the results as JSON to FILE")
+    suite.add_argument("--baseline", metavar="FILE",
+                       help="compare with the JSON results in FILE and exit with 1 on regressions")
+    suite.add_argument("--threshold", type=float, default=0.1,
+                       help="relative slowdown counted as a regression (default: 0.1)")
+
+    scaling = commands.add_parser("scaling", help="parse synthetic programs of growing size")
+    scaling.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                         help="numbers of statements to parse")
+    return parser.parse_args()
+
+def main():
+    arguments = parse_arguments()
+    if arguments.command == "scaling":
+        report_parse_scaling(parse_scaling(arguments.sizes))
+        return
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10_000))
+    report = run_suite(arguments)
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("engine") != report["engine"]:
+            print(f"\nWarning: the baseline was measured with the {baseline.get('engine')} engine")
+        regressions = compare(report, baseline, arguments.threshold)
+        print_comparison(regressions, arguments.threshold)
+        if regressions:
+            exit(1)
+
+if __name__ == "__main__":
+    main()
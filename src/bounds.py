@@ -0,0 +1,143 @@
+import copy
+from abraham import Abraham
+from symbol_table import Symbol
+from visitor import NodeVisitor
+
+BOOL = Symbol(type="bool", shape=(1, ))
+
+def nodes(node):
+    # Every node of a subtree, the blocks of nested statements included
+    if isinstance(node, Abraham.Node):
+        yield node
+        for value in vars(node).values():
+            yield from nodes(value)
+    elif isinstance(node, list):
+        for element in node:
+            yield from nodes(element)
+
+def assigned(block):
+    # Variables a block may give another value, element assignments don't count: they never
+    # change the shape of a matrix
+    names = set()
+    for node in nodes(block):
+        if isinstance(node, Abraham.AssignStatement) and isinstance(node.left, Abraham.Identifier):
+            names.add(node.left.name)
+        elif isinstance(node, Abraham.For):
+            names.add(node.iterator)
+    return names
+
+def stores(block):
+    # Element assignments in a loop body, those in nested loops belong to the nested loop
+    for statement in block.content if isinstance(block, Abraham.StatementList) else [block]:
+        if isinstance(statement, Abraham.StatementList):
+            yield from stores(statement)
+        elif isinstance(statement, Abraham.If):
+            yield from stores(statement.block)
+            if statement.else_block is not None:
+                yield from stores(statement.else_block)
+        elif isinstance(statement, Abraham.While):
+            yield from stores(statement.block)
+        elif (isinstance(statement, Abraham.AssignStatement) and isinstance(statement.left, Abraham.BinOp)
+              and statement.left.operator == "SUBSCRIPT" and isinstance(statement.left.left, Abraham.Identifier)):
+            yield statement
+
+
+# Proves the indices of element assignments in a for loop once, before it: a hidden `$` variable
+# holds whether the loop's whole range lies inside the matrix as it is then, and the stores skip
+# check_indices while it's true. Runs last, after every pass that rewrites statements.
+class BoundsChecks(NodeVisitor):
+
+    def __init__(self, optimizer):
+        # Changes go into the Optimizer's report
+        self.optimizer = optimizer
+        self.count = 0
+        # Iterators of the enclosing for loops
+        self.iterators = []
+
+    def eliminate(self, root):
+        return self.visit(root)
+
+    def index(self, node, loop, changed):
+        # What the guard checks for one index, None when it can't be proved
+        if isinstance(node, Abraham.Numericek) and type(node.value) is int:
+            return copy.deepcopy(node)
+        if not isinstance(node, Abraham.Identifier) or node.name in changed or node.name not in self.iterators:
+            return None
+        if node.name != loop.iterator:
+            return copy.deepcopy(node)
+        if not (isinstance(loop.range, Abraham.BinOp) and loop.range.operator == ":"):
+            return None
+        return copy.deepcopy(loop.range)
+
+    def check(self, store, loop, changed):
+        subscript = store.left
+        if subscript.left.name in changed:
+            return None
+        indices = [self.index(index, loop, changed) for index in subscript.right.content]
+        if not indices or None in indices:
+            return None
+        # Only the shape goes into the argument list, the guard needs nothing else of the matrix
+        matrix = Abraham.ExpressionList(content=[copy.deepcopy(subscript.left)])
+        shape = Abraham.FunctionCall(name="shape", arguments=matrix, lineno=store.lineno)
+        arguments = Abraham.ExpressionList(content=[Abraham.ExpressionList(content=[shape, *indices])])
+        guard = Abraham.FunctionCall(name="in_bounds", arguments=arguments, lineno=store.lineno)
+        guard.symbol = BOOL
+        return guard
+
+    # ====== Statements ======
+
+    def visit_StatementList(self, node):
+        content = []
+        for statement in node.content:
+            statement = self.visit(statement)
+            if isinstance(statement, Abraham.StatementList):
+                content.extend(statement.content)
+            else:
+                content.append(statement)
+        node.content = content
+        return node
+
+    def visit_If(self, node):
+        node.block = self.visit(node.block)
+        if node.else_block is not None:
+            node.else_block = self.visit(node.else_block)
+        return node
+
+    def visit_While(self, node):
+        node.block = self.visit(node.block)
+        return node
+
+    def visit_For(self, node):
+        self.iterators.append(node.iterator)
+        node.block = self.visit(node.block)
+        changed = assigned(node.block)
+        checks = []
+        proved = []
+        for store in stores(node.block):
+            guard = self.check(store, node, changed)
+            if guard is None:
+                continue
+            proved.append(store)
+            if guard not in checks:
+                checks.append(guard)
+        self.iterators.pop()
+        if not checks:
+            return node
+
+        self.count += 1
+        name = f"$bounds{self.count}"
+        condition = checks[0]
+        for guard in checks[1:]:
+            condition = Abraham.BinOp(left=condition, right=guard, operator="and", lineno=node.lineno)
+            condition.symbol = BOOL
+        target = Abraham.Identifier(name=name, lineno=node.lineno)
+        target.symbol = BOOL
+        for store in proved:
+            store.in_bounds = Abraham.Identifier(name=name, lineno=store.lineno)
+            store.in_bounds.symbol = BOOL
+            self.optimizer.change(store, f"proved {self.optimizer.render(store.left)} in bounds before the loop")
+        statement = Abraham.AssignStatement(left=target, right=condition, operator="=", lineno=node.lineno)
+        return Abraham.StatementList(content=[statement, node], lineno=node.lineno)
+
+    def generic_visit(self, node):
+        return node
@@ -0,0 +1,460 @@
+from array import array
+import numpy as np
+from visitor import NodeVisitor
+from abraham import Abraham
+from resolver import Resolver
+from operators import (
+    BINARY_OPERATORS, UNARY_OPERATORS, ASSIGN_OPERATORS, IN_PLACE_OPERATORS, BUILTINS, SCALAR_BINARY_OPERATORS,
+    SCALAR_UNARY_OPERATORS, is_block, is_scalar, shares,
+)
+
+# ====== Instruction set ======
+# Every instruction is four machine words: opcode and three operands (a, b, c).
+# Operands are register indices, jump targets or small table indices.
+# Opcodes below UNARY_BASE are binary operations: regs[a] = FUNCTIONS[op](regs[b], regs[c]).
+
+# Operations on values the TypeChecker knows to be scalars get their own opcodes, so do
+# compound assignments that may update a matrix in place
+FUNCTION_NAMES = [
+    *BINARY_OPERATORS.keys(),
+    *ASSIGN_OPERATORS.keys(),
+    *(f"scalar {name}" for name in SCALAR_BINARY_OPERATORS),
+    *(f"in-place {name}" for name in IN_PLACE_OPERATORS),
+]
+FUNCTIONS = [
+    *BINARY_OPERATORS.values(),
+    *ASSIGN_OPERATORS.values(),
+    *SCALAR_BINARY_OPERATORS.values(),
+    *IN_PLACE_OPERATORS.values(),
+]
+
+UNARY_BASE = len(FUNCTIONS)
+UNARY_NAMES = [*UNARY_OPERATORS.keys(), *(f"scalar {name}" for name in SCALAR_UNARY_OPERATORS)]
+UNARY_FUNCTIONS = [*UNARY_OPERATORS.values(), *SCALAR_UNARY_OPERATORS.values()]
+
+def binary_opcode(node):
+    if is_block(node):
+        return FUNCTION_NAMES.index("SLICE")
+    name = f"scalar {node.operator}" if is_scalar(node.symbol) else node.operator
+    return FUNCTION_NAMES.index(name)
+
+def assign_opcode(node):
+    name = node.operator if is_scalar(node.left.symbol) else f"in-place {node.operator}"
+    return FUNCTION_NAMES.index(name)
+
+def unary_opcode(node):
+    name = f"scalar {node.operator}" if is_scalar(node.symbol) else node.operator
+    return UNARY_BASE + UNARY_NAMES.index(name)
+
+BUILTIN_NAMES = list(BUILTINS.keys())
+BUILTIN_FUNCTIONS = list(BUILTINS.values())
+SHARE = BUILTIN_NAMES.index("share")
+
+OPCODE_NAMES = [
+    *(f"BINARY {name}" for name in FUNCTION_NAMES),
+    *(f"UNARY {name}" for name in UNARY_NAMES),
+    "MOVE",             # regs[a] = regs[b]
+    "JUMP",             # pc = a
+    "JUMP_IF_FALSE",    # if not regs[a]: pc = b
+    "JUMP_IF_SET",      # if regs[a] is not None: pc = b
+    "GET_ITER",         # regs[a] = iter(regs[b])
+    "FOR_ITER",         # regs[b] = next(regs[a]), on exhaustion pc = c
+    "BUILD_LIST",       # regs[a] = regs[b:b + c]
+    "BUILD_VECTOR",     # regs[a] = np.array(regs[b:b + c])
+    "BUILD_MATRIX",     # regs[a] = np.concatenate(regs[b:b + c], axis=0)
+    "CALL",             # regs[a] = BUILTIN_FUNCTIONS[b](regs[c])
+    "CALL_KERNEL",      # regs[a] = regs[b](regs[c]), regs[b] holds a fused Kernel
+    "PRINT",            # print(regs[a])
+    "STORE_SUBSCRIPT",  # regs[a][*regs[b]] = regs[c]
+    "STORE_SLICE",      # regs[a][slices(regs[b])] = regs[c]
+    "STORE_ELEMENT",    # regs[a][*regs[b]] = regs[c], the indices are known to be in bounds
+    "ENTER",            # reset the registers of scope a
+    "RETURN",           # stop, scope a is the innermost active scope
+    "HALT",
+]
+
+MOVE = OPCODE_NAMES.index("MOVE")
+JUMP = OPCODE_NAMES.index("JUMP")
+JUMP_IF_FALSE = OPCODE_NAMES.index("JUMP_IF_FALSE")
+JUMP_IF_SET = OPCODE_NAMES.index("JUMP_IF_SET")
+GET_ITER = OPCODE_NAMES.index("GET_ITER")
+FOR_ITER = OPCODE_NAMES.index("FOR_ITER")
+BUILD_LIST = OPCODE_NAMES.index("BUILD_LIST")
+BUILD_VECTOR = OPCODE_NAMES.index("BUILD_VECTOR")
+BUILD_MATRIX = OPCODE_NAMES.index("BUILD_MATRIX")
+CALL = OPCODE_NAMES.index("CALL")
+CALL_KERNEL = OPCODE_NAMES.index("CALL_KERNEL")
+PRINT = OPCODE_NAMES.index("PRINT")
+STORE_SUBSCRIPT = OPCODE_NAMES.index("STORE_SUBSCRIPT")
+STORE_SLICE = OPCODE_NAMES.index("STORE_SLICE")
+STORE_ELEMENT = OPCODE_NAMES.index("STORE_ELEMENT")
+ENTER = OPCODE_NAMES.index("ENTER")
+RETURN = OPCODE_NAMES.index("RETURN")
+HALT = OPCODE_NAMES.index("HALT")
+
+INSTRUCTION_SIZE = 4
+
+
+class Code:
+    def __init__(self):
+        self.instructions = array("q")
+        # Initial register file. Constants are preloaded, variables and temporaries start as None.
+        self.registers = []
+        self.register_names = []
+        # (name, parent scope index, [(variable name, register), ...]), global scope is index 0
+        self.scopes = []
+
+    def __len__(self):
+        return len(self.instructions) // INSTRUCTION_SIZE
+
+    def emit(self, opcode, a=0, b=0, c=0):
+        self.instructions.extend((opcode, a, b, c))
+        return len(self) - 1
+
+    def patch(self, position, operand, value):
+        self.instructions[position * INSTRUCTION_SIZE + 1 + operand] = value
+
+    def last_result(self):
+        # The register the last instruction computes a value into, None for anything else
+        if not len(self):
+            return None
+        opcode, a = self.instructions[-INSTRUCTION_SIZE:-INSTRUCTION_SIZE + 2]
+        if opcode < MOVE or opcode in (BUILD_LIST, BUILD_VECTOR, BUILD_MATRIX, CALL, CALL_KERNEL):
+            return a
+        return None
+
+    def scope_registers(self, scope):
+        return [register for _, register in self.scopes[scope][2]]
+
+
+class BytecodeCompiler(NodeVisitor):
+    def __init__(self):
+        self.code = Code()
+        self.constants = {}
+        # Registers of the slots of the enclosing frames, indexed by depth
+        self.frames = []
+        # Enclosing scopes, elided ones included since they still show up in the memory dump
+        self.scope_stack = []
+        self.loops = []
+        # Temporaries are allocated like a stack and released after every statement.
+        self.free_temporaries = []
+        self.temporaries_in_use = []
+
+    def compile(self, root):
+        self.push_frame(Resolver().resolve(root))
+        self.visit(root)
+        self.code.emit(HALT)
+        return self.code
+
+    # ====== Registers ======
+
+    def new_register(self, name, value=None):
+        self.code.registers.append(value)
+        self.code.register_names.append(name)
+        return len(self.code.registers) - 1
+
+    def constant(self, value):
+        key = (type(value), value)
+        if key not in self.constants:
+            self.constants[key] = self.new_register(repr(value), value)
+        return self.constants[key]
+
+    def temporary(self):
+        if self.free_temporaries:
+            register = self.free_temporaries.pop()
+        else:
+            register = self.new_register(f"t{len(self.code.registers)}")
+        self.temporaries_in_use.append(register)
+        return register
+
+    def temporaries(self, count):
+        # BUILD_LIST, BUILD_VECTOR and BUILD_MATRIX need their operands in consecutive registers
+        start = len(self.code.registers)
+        for i in range(count):
+            self.temporaries_in_use.append(self.new_register(f"t{start + i}"))
+        return start
+
+    def release_temporaries(self):
+        self.free_temporaries.extend(reversed(self.temporaries_in_use))
+        self.temporaries_in_use = []
+
+    # Every slot of a resolved frame gets its own register
+    def push_frame(self, layout):
+        registers = [self.new_register(name) for name in layout.names]
+        parent = self.scope_stack[-1] if self.scope_stack else None
+        self.code.scopes.append((layout.name, parent, list(zip(layout.names, registers))))
+        scope = len(self.code.scopes) - 1
+        self.scope_stack.append(scope)
+        if layout.elided:
+            return
+        self.frames.append(registers)
+        if self.frames[:-1] and registers:
+            self.code.emit(ENTER, scope)
+
+    def pop_frame(self, layout):
+        self.scope_stack.pop()
+        if not layout.elided:
+            self.frames.pop()
+
+    def variable(self, slot):
+        if slot is None:
+            return self.constant(None)
+        depth, index = slot
+        return self.frames[depth][index]
+
+    # ====== Statements ======
+
+    def visit_StatementList(self, node):
+        for statement in node.content:
+            self.visit(statement)
+            self.release_temporaries()
+
+    def visit_AssignStatement(self, node):
+        is_identifier = isinstance(node.left, Abraham.Identifier)
+        is_subscript = isinstance(node.left, Abraham.BinOp) and node.left.operator == "SUBSCRIPT"
+
+        if is_identifier and node.operator == "=":
+            value = self.expression(node.right)
+            target = self.variable(node.left.slot)
+            if shares(node.right):
+                # Copy on write, see operators.share
+                self.code.emit(CALL, target, SHARE, value)
+                return
+            if value in self.temporaries_in_use and self.code.last_result() == value:
+                # Computed straight into the variable, no MOVE
+                self.code.patch(len(self.code) - 1, 0, target)
+                return
+            self.code.emit(MOVE, target, value)
+            return
+
+        value = self.expression(node.right)
+        if is_identifier:
+            target = self.variable(node.left.slot)
+            self.code.emit(assign_opcode(node), target, target, value)
+            return
+
+        if is_subscript:
+            matrix = self.expression(node.left.left)
+            indices = self.expression(node.left.right)
+            if node.operator != "=":
+                element = self.temporary()
+                self.code.emit(binary_opcode(node.left), element, matrix, indices)
+                self.code.emit(FUNCTION_NAMES.index(node.operator), element, element, value)
+                value = element
+            if node.in_bounds is not None:
+                # Indices BoundsChecks proved before the loop aren't checked again
+                proved = self.expression(node.in_bounds)
+                jump_to_checked = self.code.emit(JUMP_IF_FALSE, proved)
+                self.code.emit(STORE_ELEMENT, matrix, indices, value)
+                jump_to_end = self.code.emit(JUMP)
+                self.code.patch(jump_to_checked, 1, len(self.code))
+                self.code.emit(STORE_SUBSCRIPT, matrix, indices, value)
+                self.code.patch(jump_to_end, 0, len(self.code))
+                return
+            self.code.emit(STORE_SLICE if is_block(node.left) else STORE_SUBSCRIPT, matrix, indices, value)
+
+    def visit_If(self, node):
+        self.push_frame(node.frame)
+        condition = self.expression(node.condition)
+        self.release_temporaries()
+        jump_to_else = self.code.emit(JUMP_IF_FALSE, condition)
+        self.visit(node.block)
+        if node.else_block is not None:
+            jump_to_end = self.code.emit(JUMP)
+            self.code.patch(jump_to_else, 1, len(self.code))
+            self.visit(node.else_block)
+            self.code.patch(jump_to_end, 0, len(self.code))
+        else:
+            self.code.patch(jump_to_else, 1, len(self.code))
+        self.pop_frame(node.frame)
+
+    def visit_While(self, node):
+        self.push_frame(node.frame)
+        start = len(self.code)
+        condition = self.expression(node.condition)
+        self.release_temporaries()
+        exit_jump = self.code.emit(JUMP_IF_FALSE, condition)
+        self.loop(node.block, start)
+        self.code.emit(JUMP, start)
+        self.code.patch(exit_jump, 1, len(self.code))
+        self.patch_breaks()
+        self.pop_frame(node.frame)
+
+    def visit_For(self, node):
+        self.push_frame(node.frame)
+        iterable = self.expression(node.range)
+        if shares(node.range):
+            # The rows of a matrix are views of it
+            shared = self.temporary()
+            self.code.emit(CALL, shared, SHARE, iterable)
+            iterable = shared
+        # The iterator register must outlive the body, so it's never handed back as a temporary.
+        iterator = self.new_register(f"iter({node.iterator})")
+        self.code.emit(GET_ITER, iterator, iterable)
+        self.release_temporaries()
+        variable = self.variable(node.iterator_slot)
+        start = self.code.emit(FOR_ITER, iterator, variable)
+        self.loop(node.block, start)
+        self.code.emit(JUMP, start)
+        self.code.patch(start, 2, len(self.code))
+        self.patch_breaks()
+        self.pop_frame(node.frame)
+
+    def loop(self, block, continue_target):
+        self.loops.append((continue_target, []))
+        self.visit(block)
+
+    def patch_breaks(self):
+        _, breaks = self.loops.pop()
+        for position in breaks:
+            self.code.patch(position, 0, len(self.code))
+
+    def visit_Return(self, node):
+        self.expression(node.value)
+        self.code.emit(RETURN, self.scope_stack[-1])
+
+    def visit_Control(self, node):
+        if not self.loops:
+            return
+        continue_target, breaks = self.loops[-1]
+        if node.type == "break":
+            breaks.append(self.code.emit(JUMP))
+        if node.type == "continue":
+            self.code.emit(JUMP, continue_target)
+
+    def visit_FunctionCall(self, node):
+        if node.name == "print":
+            self.code.emit(PRINT, self.expression(node.arguments.content[0]))
+            return
+        self.expression(node)
+
+    # Standalone expressions are evaluated for their errors only
+    def generic_visit(self, node):
+        if isinstance(node, Abraham.Expression):
+            self.expression(node)
+            return
+        super().generic_visit(node)
+
+    # ====== Expressions ======
+    # Every expression compiles into a register holding its value.
+
+    def expression(self, node):
+        if isinstance(node, Abraham.Identifier):
+            return self.variable(node.slot)
+        if isinstance(node, Abraham.Numericek):
+            return self.constant(node.value)
+        if isinstance(node, Abraham.String):
+            return self.constant(node.value[1:-1])
+        if isinstance(node, Abraham.Constant):
+            if not isinstance(node.value, np.ndarray):
+                return self.constant(node.value)
+            # Registers are shared by every execution, the array itself must never leak out
+            array = self.new_register(f"array{node.value.shape}", node.value)
+            target = self.temporary()
+            self.code.emit(CALL, target, BUILTIN_NAMES.index("copy"), array)
+            return target
+
+        if isinstance(node, Abraham.Memo):
+            # The hidden variable's own register is the value
+            target = self.variable(node.slot)
+            skip = self.code.emit(JUMP_IF_SET, target) if node.lazy else None
+            value = self.expression(node.value)
+            if shares(node.value):
+                self.code.emit(CALL, target, SHARE, value)
+            else:
+                self.code.emit(MOVE, target, value)
+            if skip is not None:
+                self.code.patch(skip, 1, len(self.code))
+            return target
+
+        if isinstance(node, Abraham.Fused):
+            operands = self.sequence(BUILD_LIST, node.operands)
+            kernel = self.new_register(f"kernel{node.kernel.operations}", node.kernel)
+            target = self.temporary()
+            self.code.emit(CALL_KERNEL, target, kernel, operands)
+            return target
+
+        if isinstance(node, Abraham.BinOp):
+            left = self.expression(node.left)
+            right = self.expression(node.right)
+            target = self.temporary()
+            self.code.emit(binary_opcode(node), target, left, right)
+            return target
+
+        if isinstance(node, Abraham.UnaryOp):
+            operand = self.expression(node.operand)
+            target = self.temporary()
+            self.code.emit(unary_opcode(node), target, operand)
+            return target
+
+        if isinstance(node, Abraham.ExpressionList):
+            return self.sequence(BUILD_LIST, node.content)
+
+        if isinstance(node, Abraham.Vector):
+            return self.sequence(BUILD_VECTOR, node.content.content)
+
+        if isinstance(node, Abraham.Matrix):
+            return self.sequence(BUILD_MATRIX, node.rows)
+
+        if isinstance(node, Abraham.FunctionCall):
+            argument = self.expression(node.arguments.content[0])
+            target = self.temporary()
+            self.code.emit(CALL, target, BUILTIN_NAMES.index(node.name), argument)
+            return target
+
+        # Every kind of expression is compiled above
+        raise TypeError(f"{node.__class__.__name__} is not an expression")
+
+    def sequence(self, opcode, elements):
+        values = [self.expression(element) for element in elements]
+        start = self.temporaries(len(values))
+        for offset, value in enumerate(values):
+            self.code.emit(MOVE, start + offset, value)
+        target = self.temporary()
+        self.code.emit(opcode, target, start, len(values))
+        return target
+
+
+def format_operand(code, register):
+    return f"r{register} ({code.register_names[register]})"
+
+def disassemble(code):
+    lines = []
+    for index, (name, parent, variables) in enumerate(code.scopes):
+        registers = ", ".join(f"{variable}=r{register}" for variable, register in variables)
+        lines.append(f"scope {index} {name} (parent {parent}): {registers}")
+    lines.append("")
+
+    for pc in range(len(code)):
+        opcode, a, b, c = code.instructions[pc * INSTRUCTION_SIZE:(pc + 1) * INSTRUCTION_SIZE]
+        name = OPCODE_NAMES[opcode]
+        if opcode < UNARY_BASE:
+            operands = [format_operand(code, r) for r in (a, b, c)]
+        elif opcode < MOVE:
+            operands = [format_operand(code, r) for r in (a, b)]
+        elif opcode == MOVE:
+            operands = [format_operand(code, r) for r in (a, b)]
+        elif opcode == JUMP:
+            operands = [f"-> {a}"]
+        elif opcode in (JUMP_IF_FALSE, JUMP_IF_SET):
+            operands = [format_operand(code, a), f"-> {b}"]
+        elif opcode == GET_ITER:
+            operands = [format_operand(code, a), format_operand(code, b)]
+        elif opcode == FOR_ITER:
+            operands = [format_operand(code, a), format_operand(code, b), f"-> {c}"]
+        elif opcode in (BUILD_LIST, BUILD_VECTOR, BUILD_MATRIX):
+            operands = [format_operand(code, a), f"r{b}..r{b + c - 1}" if c else "[]"]
+        elif opcode == CALL:
+            operands = [format_operand(code, a), BUILTIN_NAMES[b], format_operand(code, c)]
+        elif opcode == CALL_KERNEL:
+            operands = [format_operand(code, r) for r in (a, b, c)]
+        elif opcode == PRINT:
+            operands = [format_operand(code, a)]
+        elif opcode in (STORE_SUBSCRIPT, STORE_SLICE, STORE_ELEMENT):
+            operands = [format_operand(code, r) for r in (a, b, c)]
+        elif opcode in (ENTER, RETURN):
+            operands = [f"scope {a}"]
+        else:
+            operands = []
+        lines.append(f"{pc:6}  {name:<16}{', '.join(operands)}")
+    return "\n".join(lines)
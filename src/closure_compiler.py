@@ -0,0 +1,361 @@
+from visitor import NodeVisitor
+from memory import FrameStack
+import numpy as np
+from control_statements import ReturnSignal, BREAK, CONTINUE
+from abraham import Abraham
+from operators import (
+    ASSIGN_OPERATORS, BUILTINS, assign_function, binary_function, copy, divide, is_block, is_scalar, share,
+    shares, slices, unary_function, unshared,
+)
+from ranges import Range
+from resolver import Resolver
+
+# Scalar operations written out in the closure, which saves calling the operator function
+SCALAR_CLOSURES = {
+    "+": lambda left, right: lambda: left() + right(),
+    "-": lambda left, right: lambda: left() - right(),
+    "*": lambda left, right: lambda: left() * right(),
+    "/": lambda left, right: lambda: divide(left(), right()),
+    ".+": lambda left, right: lambda: left() + right(),
+    ".-": lambda left, right: lambda: left() - right(),
+    ".*": lambda left, right: lambda: left() * right(),
+    "./": lambda left, right: lambda: divide(left(), right()),
+    "==": lambda left, right: lambda: left() == right(),
+    "!=": lambda left, right: lambda: left() != right(),
+    ">": lambda left, right: lambda: left() > right(),
+    ">=": lambda left, right: lambda: left() >= right(),
+    "<": lambda left, right: lambda: left() < right(),
+    "<=": lambda left, right: lambda: left() <= right(),
+}
+
+def leave_scope(frame_stack, frame, signal):
+    # A return leaves the frames it passes through on the stack for the memory dump, like the
+    # Interpreter does. Scopes elided by the Resolver are put back in their place.
+    if isinstance(signal, ReturnSignal):
+        if frame.elided:
+            frame_stack.restore(frame)
+    elif not frame.elided:
+        frame_stack.pop()
+
+# Instead of walking the tree on every evaluation like the Interpreter does, every node is
+# visited exactly once and turned into a closure. Operators are resolved and child
+# evaluators are captured at compile time, so running the program is just calling closures.
+# Variables are read and written by the (depth, slot) positions the Resolver assigned.
+class ClosureCompiler(NodeVisitor):
+    def __init__(self):
+        self.frame_stack = None
+
+    def error(self, message: str) -> None:
+        print(f"RuntimeError: {message}")
+
+    def panic(self, message: str) -> None:
+        self.error(message)
+        exit()
+
+    def compile(self, root):
+        self.frame_stack = FrameStack(Resolver().resolve(root))
+        return self.visit(root)
+
+    def interpret(self, root):
+        program = self.compile(root)
+        program()
+        print("\nMemory dump:")
+        self.frame_stack.dump_memory()
+
+    def check_indices(self, matrix, args):
+        shape = matrix.shape
+        for bound, index in zip(shape, args):
+            if type(index) is Range:
+                # A block must lie inside the matrix, numpy would quietly cut it short
+                if index.start < 0 or index.start > index.stop or index.stop > bound:
+                    self.panic("Index out of bounds.")
+            elif index < 0 or index >= bound:
+                self.panic("Index out of bounds.")
+
+    def compile_load(self, slot):
+        if slot is None:
+            return lambda: None
+        depth, index = slot
+        if depth == 0:
+            # The global frame lives as long as the program, so it can be captured directly
+            frame = self.frame_stack.frames[0]
+            return lambda: frame[index]
+        frames = self.frame_stack.frames
+        return lambda: frames[depth][index]
+
+    def compile_store(self, slot):
+        depth, index = slot
+        if depth == 0:
+            frame = self.frame_stack.frames[0]
+            def store(value):
+                frame[index] = value
+            return store
+        frames = self.frame_stack.frames
+        def store(value):
+            frames[depth][index] = value
+        return store
+
+    def compile_stored_matrix(self, slot):
+        # Copy on write: a shared matrix is replaced by its own copy before elements change
+        load = self.compile_load(slot)
+        store = self.compile_store(slot)
+        def stored_matrix():
+            matrix = unshared(load())
+            store(matrix)
+            return matrix
+        return stored_matrix
+
+    def compile_lvalue(self, node, in_bounds=None):
+        is_identifier = isinstance(node, Abraham.Identifier)
+        is_subscript = isinstance(node, Abraham.BinOp) and node.operator == "SUBSCRIPT"
+
+        if is_identifier:
+            return self.compile_store(node.slot)
+
+        if is_subscript:
+            stored_matrix = self.compile_stored_matrix(node.left.slot)
+            indices = self.visit(node.right)
+            check_indices = self.check_indices
+            if is_block(node):
+                def store(value):
+                    args = indices()
+                    matrix = stored_matrix()
+                    check_indices(matrix, args)
+                    matrix[slices(args)] = value
+                return store
+            if in_bounds is not None:
+                # Indices BoundsChecks proved before the loop aren't checked again
+                def store(value):
+                    args = indices()
+                    matrix = stored_matrix()
+                    if not in_bounds():
+                        check_indices(matrix, args)
+                    matrix[*args] = value
+                return store
+            def store(value):
+                args = indices()
+                matrix = stored_matrix()
+                check_indices(matrix, args)
+                matrix[*args] = value
+            return store
+
+        return lambda value: None
+
+    # Statement closures return None or the signal that ends the enclosing statements early
+    def compile_statement(self, node):
+        run = self.visit(node)
+        if not isinstance(node, Abraham.Expression):
+            return run
+        # The value of an expression statement is thrown away, it must not look like a signal
+        def statement():
+            run()
+        return statement
+
+    def visit_StatementList(self, node):
+        statements = tuple(self.compile_statement(statement) for statement in node.content)
+        def run():
+            for statement in statements:
+                signal = statement()
+                if signal is not None:
+                    return signal
+        return run
+
+    def visit_AssignStatement(self, node):
+        value = self.visit(node.right)
+        in_bounds = self.visit(node.in_bounds) if node.in_bounds is not None else None
+        if node.operator == "=":
+            store = self.compile_lvalue(node.left, in_bounds)
+            if isinstance(node.left, Abraham.Identifier) and shares(node.right):
+                def run():
+                    store(share(value()))
+                return run
+            def run():
+                store(value())
+            return run
+
+        if isinstance(node.left, Abraham.Identifier):
+            # Straight from the frame, a matrix only the variable holds is updated in place
+            load = self.compile_load(node.left.slot)
+            store = self.compile_store(node.left.slot)
+            update = assign_function(node)
+            def run():
+                right = value()
+                store(update(load(), right))
+            return run
+
+        # The indices are evaluated once for the read and the store
+        stored_matrix = self.compile_stored_matrix(node.left.left.slot)
+        indices = self.visit(node.left.right)
+        read = binary_function(node.left)
+        combine = ASSIGN_OPERATORS[node.operator]
+        check_indices = self.check_indices
+        key = slices if is_block(node.left) else tuple
+        proved = in_bounds or (lambda: False)
+        def run():
+            right = value()
+            args = indices()
+            matrix = stored_matrix()
+            original = read(matrix, args)
+            if not proved():
+                check_indices(matrix, args)
+            matrix[key(args)] = combine(original, right)
+        return run
+
+    def visit_If(self, node):
+        frame_stack = self.frame_stack
+        frame = node.frame
+        condition = self.visit(node.condition)
+        block = self.compile_statement(node.block)
+        else_block = self.compile_statement(node.else_block) if node.else_block is not None else None
+        elided = frame.elided
+        def run():
+            if not elided:
+                frame_stack.push(frame)
+            signal = None
+            if condition():
+                signal = block()
+            elif else_block is not None:
+                signal = else_block()
+            leave_scope(frame_stack, frame, signal)
+            return signal
+        return run
+
+    def visit_While(self, node):
+        frame_stack = self.frame_stack
+        frame = node.frame
+        condition = self.visit(node.condition)
+        block = self.compile_statement(node.block)
+        elided = frame.elided
+        def run():
+            if not elided:
+                frame_stack.push(frame)
+            while condition():
+                signal = block()
+                if signal is not None:
+                    if signal is BREAK:
+                        break
+                    if signal is CONTINUE:
+                        continue
+                    leave_scope(frame_stack, frame, signal)
+                    return signal
+            if not elided:
+                frame_stack.pop()
+        return run
+
+    def visit_For(self, node):
+        frame_stack = self.frame_stack
+        frame = node.frame
+        iterable = self.visit(node.range)
+        if shares(node.range):
+            # The rows of a matrix are views of it
+            rows = iterable
+            iterable = lambda: share(rows())
+        block = self.compile_statement(node.block)
+        store = self.compile_store(node.iterator_slot)
+        elided = frame.elided
+        def run():
+            if not elided:
+                frame_stack.push(frame)
+            for i in iterable():
+                store(i)
+                signal = block()
+                if signal is not None:
+                    if signal is BREAK:
+                        break
+                    if signal is CONTINUE:
+                        continue
+                    leave_scope(frame_stack, frame, signal)
+                    return signal
+            if not elided:
+                frame_stack.pop()
+        return run
+
+    def visit_Return(self, node):
+        value = self.visit(node.value)
+        return lambda: ReturnSignal(value())
+
+    def visit_Control(self, node):
+        if node.type == "break":
+            return lambda: BREAK
+        if node.type == "continue":
+            return lambda: CONTINUE
+        return lambda: None
+
+    def visit_ExpressionList(self, node):
+        elements = tuple(self.visit(elem) for elem in node.content)
+        return lambda: [element() for element in elements]
+
+    def visit_Identifier(self, node):
+        return self.compile_load(node.slot)
+
+    def visit_Numericek(self, node):
+        value = node.value
+        return lambda: value
+
+    def visit_String(self, node):
+        value = node.value[1:-1]
+        return lambda: value
+
+    def visit_Constant(self, node):
+        value = node.value
+        if isinstance(value, np.ndarray):
+            return lambda: copy(value)
+        return lambda: value
+
+    def visit_Memo(self, node):
+        value = self.visit(node.value)
+        if shares(node.value):
+            computed = value
+            value = lambda: share(computed())
+        store = self.compile_store(node.slot)
+        if not node.lazy:
+            def run():
+                result = value()
+                store(result)
+                return result
+            return run
+
+        load = self.compile_load(node.slot)
+        def run():
+            result = load()
+            if result is None:
+                result = value()
+                store(result)
+            return result
+        return run
+
+    def visit_Fused(self, node):
+        operands = tuple(self.visit(operand) for operand in node.operands)
+        kernel = node.kernel
+        return lambda: kernel([operand() for operand in operands])
+
+    def visit_Vector(self, node):
+        elements = self.visit(node.content)
+        return lambda: np.array(elements())
+
+    def visit_Matrix(self, node):
+        rows = tuple(self.visit(v) for v in node.rows)
+        return lambda: np.concatenate([row() for row in rows], axis=0)
+
+    def visit_FunctionCall(self, node):
+        arguments = [self.visit(elem) for elem in node.arguments.content]
+        if node.name == "print":
+            def run():
+                print(arguments[0]())
+            return run
+
+        function = BUILTINS[node.name]
+        return lambda: function(arguments[0]())
+
+    def visit_BinOp(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if is_scalar(node.symbol) and node.operator in SCALAR_CLOSURES:
+            return SCALAR_CLOSURES[node.operator](left, right)
+        function = binary_function(node)
+        return lambda: function(left(), right())
+
+    def visit_UnaryOp(self, node):
+        operand = self.visit(node.operand)
+        function = unary_function(node)
+        return lambda: function(operand())
@@ -0,0 +1,303 @@
+from collections import defaultdict
+from abraham import Abraham
+from visitor import NodeVisitor
+
+def is_operation(node):
+    # Ranges stay where the engines expect them, everything else is a leaf as cheap as a read
+    return (isinstance(node, Abraham.BinOp) and node.operator != ":") or isinstance(node, Abraham.UnaryOp)
+
+
+# The variables a piece of code assigns, element assignments included
+class Writes(NodeVisitor):
+
+    def __init__(self):
+        self.names = set()
+
+    def visit_AssignStatement(self, node):
+        if isinstance(node.left, Abraham.Identifier):
+            self.names.add(node.left.name)
+        else:
+            self.names.add(node.left.left.name)
+
+    def visit_If(self, node):
+        self.visit(node.block)
+        if node.else_block is not None:
+            self.visit(node.else_block)
+
+    def visit_While(self, node):
+        self.visit(node.block)
+
+    def visit_For(self, node):
+        self.names.add(node.iterator)
+        self.visit(node.block)
+
+    def generic_visit(self, node):
+        if isinstance(node, Abraham.StatementList):
+            super().generic_visit(node)
+
+
+# Keeps the values of repeated pure expressions in hidden `$` variables. An operation a loop
+# doesn't change becomes a lazy Memo, reset before the loop and computed where the loop first
+# needs it. An operation a block computes again with the same variables is read back.
+# Loops go outermost first. Runs after the Vectorizer, which doesn't know Memo nodes.
+class CodeMotion(NodeVisitor):
+
+    def __init__(self, optimizer):
+        # Changes go into the Optimizer's report
+        self.optimizer = optimizer
+        self.keys = {}
+        self.count = 0
+
+    def optimize(self, root):
+        root = self.visit(root)
+        self.eliminate(root)
+        return root
+
+    def new_name(self):
+        self.count += 1
+        return f"${self.count}"
+
+    def memo(self, name, node, lazy):
+        memo = Abraham.Memo(name=name, value=node, lazy=lazy, lineno=node.lineno)
+        memo.symbol = node.symbol
+        return memo
+
+    def read(self, name, node):
+        identifier = Abraham.Identifier(name=name, lineno=node.lineno)
+        identifier.symbol = node.symbol
+        return identifier
+
+    def analyze(self, node):
+        # (structural identity, variables read) of a side-effect free expression, the
+        # identity is None for anything else
+        entry = self.keys.get(id(node))
+        if entry is not None:
+            return entry[1:]
+        if isinstance(node, Abraham.Identifier):
+            key, variables = ("name", node.name), frozenset([node.name])
+        elif isinstance(node, Abraham.Memo):
+            key, variables = ("memo", node.name), frozenset([node.name])
+        elif isinstance(node, Abraham.Numericek):
+            key, variables = ("number", repr(node.value)), frozenset()
+        elif isinstance(node, Abraham.String):
+            key, variables = ("string", node.value), frozenset()
+        elif isinstance(node, Abraham.Constant):
+            key, variables = ("constant", id(node)), frozenset()
+        elif isinstance(node, Abraham.BinOp):
+            key, variables = self.compound(node.operator, node.left, node.right)
+        elif isinstance(node, Abraham.UnaryOp):
+            key, variables = self.compound(("unary", node.operator), node.operand)
+        elif isinstance(node, Abraham.ExpressionList):
+            key, variables = self.compound("list", *node.content)
+        elif isinstance(node, Abraham.Vector):
+            key, variables = self.compound("vector", node.content)
+        elif isinstance(node, Abraham.FunctionCall) and node.name != "print":
+            key, variables = self.compound(("call", node.name), node.arguments)
+        else:
+            key, variables = None, frozenset()
+        # The node is kept alive with its key, so its id can't be reused
+        self.keys[id(node)] = (node, key, variables)
+        return key, variables
+
+    def compound(self, head, *children):
+        keys, variables = zip(*(self.analyze(child) for child in children)) if children else ((), ())
+        if None in keys:
+            return None, frozenset()
+        return (head, *keys), frozenset().union(*variables)
+
+    def is_candidate(self, node):
+        if not is_operation(node):
+            return False
+        key, variables = self.analyze(node)
+        return key is not None and bool(variables)
+
+    # ====== Rewriting ======
+
+    def rewrite(self, node, replace):
+        # `replace` returns the node that takes the place of an expression, or None to go on
+        # into its children. Children are visited in evaluation order.
+        new = replace(node)
+        return new if new is not None else self.descend(node, replace)
+
+    def descend(self, node, replace):
+        if isinstance(node, Abraham.BinOp):
+            node.left = self.rewrite(node.left, replace)
+            node.right = self.rewrite(node.right, replace)
+        elif isinstance(node, Abraham.UnaryOp):
+            node.operand = self.rewrite(node.operand, replace)
+        elif isinstance(node, Abraham.ExpressionList):
+            node.content = [self.rewrite(element, replace) for element in node.content]
+        elif isinstance(node, Abraham.Vector):
+            node.content = self.rewrite(node.content, replace)
+        elif isinstance(node, Abraham.FunctionCall):
+            node.arguments = self.rewrite(node.arguments, replace)
+        return node
+
+    def rewrite_assignment(self, node, replace):
+        # Only the value: the indices of an element assignment are evaluated again for the store
+        node.right = self.rewrite(node.right, replace)
+
+    # ====== Loop-invariant code motion ======
+
+    def visit_StatementList(self, node):
+        content = []
+        for statement in node.content:
+            statement = self.visit(statement)
+            if isinstance(statement, Abraham.StatementList):
+                content.extend(statement.content)
+            else:
+                content.append(statement)
+        node.content = content
+        return node
+
+    def visit_If(self, node):
+        node.block = self.visit(node.block)
+        if node.else_block is not None:
+            node.else_block = self.visit(node.else_block)
+        return node
+
+    def visit_While(self, node):
+        return self.hoist(node, "while")
+
+    def visit_For(self, node):
+        return self.hoist(node, "for")
+
+    def generic_visit(self, node):
+        return node
+
+    def hoist(self, loop, kind):
+        writes = Writes()
+        writes.visit(loop)
+        names = {}
+
+        def replace(node):
+            if not self.is_candidate(node):
+                return None
+            key, variables = self.analyze(node)
+            if variables & writes.names:
+                return None
+            if key not in names:
+                names[key] = self.new_name()
+                self.optimizer.change(loop, f"hoisted {self.optimizer.render(node)} out of the {kind} loop")
+            # Its own invariant parts may be used elsewhere in the loop too
+            return self.memo(names[key], self.descend(node, replace), lazy=True)
+
+        if isinstance(loop, Abraham.While):
+            loop.condition = self.rewrite(loop.condition, replace)
+        self.rewrite_block(loop.block, replace)
+        # Inner loops get what depends on this one
+        loop.block = self.visit(loop.block)
+        if not names:
+            return loop
+
+        resets = [Abraham.AssignStatement(
+            left=Abraham.Identifier(name=name, lineno=loop.lineno),
+            right=Abraham.Constant(value=None, lineno=loop.lineno),
+            operator="=",
+            lineno=loop.lineno,
+        ) for name in names.values()]
+        return Abraham.StatementList(content=[*resets, loop], lineno=loop.lineno)
+
+    def rewrite_block(self, node, replace):
+        # Every expression a loop body evaluates, nested blocks included
+        if isinstance(node, Abraham.StatementList):
+            for statement in node.content:
+                self.rewrite_block(statement, replace)
+        elif isinstance(node, Abraham.AssignStatement):
+            self.rewrite_assignment(node, replace)
+        elif isinstance(node, Abraham.If):
+            node.condition = self.rewrite(node.condition, replace)
+            self.rewrite_block(node.block, replace)
+            if node.else_block is not None:
+                self.rewrite_block(node.else_block, replace)
+        elif isinstance(node, Abraham.While):
+            node.condition = self.rewrite(node.condition, replace)
+            self.rewrite_block(node.block, replace)
+        elif isinstance(node, Abraham.For):
+            node.range = self.rewrite(node.range, replace)
+            self.rewrite_block(node.block, replace)
+        elif isinstance(node, Abraham.Return):
+            node.value = self.rewrite(node.value, replace)
+        elif isinstance(node, Abraham.Expression):
+            # The statement itself can't be replaced, its value isn't used anyway
+            self.descend(node, replace)
+
+    # ====== Common subexpressions ======
+
+    def eliminate(self, block):
+        # A block without braces is a single statement
+        statements = block.content if isinstance(block, Abraham.StatementList) else [block]
+        self.eliminate_block(statements)
+        for statement in statements:
+            if isinstance(statement, Abraham.StatementList):
+                self.eliminate(statement)
+            elif isinstance(statement, Abraham.If):
+                self.eliminate(statement.block)
+                if statement.else_block is not None:
+                    self.eliminate(statement.else_block)
+            elif isinstance(statement, (Abraham.While, Abraham.For)):
+                self.eliminate(statement.block)
+
+    def eliminate_block(self, statements):
+        # The block is walked twice the same way: first counting the values each operation
+        # has, then keeping the ones computed more than once.
+        counts = defaultdict(int)
+        self.scan(statements, lambda value, node, defines, replace: self.count_value(counts, value, defines))
+        if all(count < 2 for count in counts.values()):
+            return
+
+        names = {}
+        # The report gives the uses that were actually replaced: the Memo and its reads
+        uses = {}
+        def keep(value, node, defines, replace):
+            if counts[value] < 2:
+                return None
+            if value in names:
+                uses[value][2] += 1
+                return self.read(names[value], node)
+            if not defines:
+                return None
+            names[value] = self.new_name()
+            uses[value] = [node, self.optimizer.render(node), 1]
+            return self.memo(names[value], self.descend(node, replace), lazy=False)
+        self.scan(statements, keep)
+        for node, text, count in uses.values():
+            self.optimizer.change(node, f"computed {text} once for {count} uses")
+
+    def count_value(self, counts, value, defines):
+        if value not in counts and not defines:
+            return None
+        counts[value] += 1
+        # The first one goes on into its children, later ones are replaced as a whole
+        return True if counts[value] > 1 else None
+
+    def scan(self, statements, visit):
+        versions = defaultdict(int)
+
+        def replace(node, defines=True):
+            if not self.is_candidate(node):
+                return None
+            key, variables = self.analyze(node)
+            value = (key, tuple(sorted((name, versions[name]) for name in variables)))
+            result = visit(value, node, defines, replace)
+            return node if result is True else result
+
+        def reader(node):
+            # An if opens its scope before the condition, a value stored there wouldn't
+            # be visible to the rest of the block
+            return replace(node, defines=False)
+
+        for statement in statements:
+            if isinstance(statement, Abraham.AssignStatement):
+                self.rewrite_assignment(statement, replace)
+            elif isinstance(statement, Abraham.If):
+                statement.condition = self.rewrite(statement.condition, reader)
+            elif isinstance(statement, Abraham.Return):
+                statement.value = self.rewrite(statement.value, replace)
+            elif isinstance(statement, Abraham.Expression):
+                self.descend(statement, replace)
+
+            writes = Writes()
+            writes.visit(statement)
+            for name in writes.names:
+                versions[name] += 1
@@ -1,9 +1,17 @@
-class ReturnException(Exception):
+# Statements that don't simply fall through to the next one return one of these signals
+# instead of raising an exception. Normal completion is None, so the common case costs a
+# single `is not None` check in the enclosing statement list or loop.
+class Signal:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"Signal({self.name})"
+
+class ReturnSignal(Signal):
     def __init__(self, value):
+        super().__init__("return")
         self.value = value
 
-class BreakException(Exception):
-    pass
-
-class ContinueException(Exception):
-    pass
+BREAK = Signal("break")
+CONTINUE = Signal("continue")
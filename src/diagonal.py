@@ -0,0 +1,144 @@
+import numpy as np
+from numpy.lib.mixins import NDArrayOperatorsMixin
+from numpy.lib.stride_tricks import as_strided
+import spill
+
+ELEMENTWISE_UFUNCS = {np.add, np.subtract, np.multiply, np.true_divide, np.negative}
+
+def is_finite(value):
+    return bool(np.isfinite(value).all())
+
+def is_integer(index):
+    return type(index) is int or isinstance(index, np.integer)
+
+ZERO = np.float64(0.0)
+
+
+# The value of eye(n) and its multiples, kept as the dimension and the scale. Products and
+# elementwise operations give the same result as on the dense matrix, bit for bit, without
+# building it. Storing an element makes the dense matrix first, see unshared.
+class Diagonal(NDArrayOperatorsMixin):
+    __slots__ = ("dimension", "scale")
+    # Immutable, but the elementwise == of the operators rules out hashing by value
+    __hash__ = object.__hash__
+
+    dtype = np.dtype(np.float64)
+    ndim = 2
+
+    def __init__(self, dimension, scale=1.0):
+        self.dimension = dimension
+        self.scale = np.float64(scale)
+
+    @property
+    def shape(self):
+        return (self.dimension, self.dimension)
+
+    @property
+    def size(self):
+        return self.dimension * self.dimension
+
+    def __len__(self):
+        return self.dimension
+
+    def view(self):
+        # Element (i, j) is buffer[n - 1 - i + j], the scale only where i == j
+        buffer = np.zeros(2 * self.dimension - 1 if self.dimension else 1)
+        buffer[self.dimension - 1 if self.dimension else 0] = self.scale
+        start = buffer[max(self.dimension - 1, 0):]
+        return as_strided(start, shape=self.shape, strides=(-start.itemsize, start.itemsize), writeable=False)
+
+    def dense(self):
+        # Spilled to a file like zeros(n) when it's that large
+        dense = spill.zeros(self.shape)
+        np.fill_diagonal(dense, self.scale)
+        return dense
+
+    def __array__(self, dtype=None, copy=None):
+        dense = self.dense()
+        return dense if dtype is None else dense.astype(dtype, copy=False)
+
+    def element(self, index, axis):
+        # An index of a single element, counted from the end when negative like numpy does
+        if not (-self.dimension <= index < self.dimension):
+            raise IndexError(f"index {index} is out of bounds for axis {axis} with size {self.dimension}")
+        return index % self.dimension
+
+    def __getitem__(self, key):
+        # An element is computed, the view costs O(n) to build and is only for anything larger
+        if type(key) is tuple and len(key) == 2 and all(is_integer(index) for index in key):
+            row, column = self.element(key[0], 0), self.element(key[1], 1)
+            return self.scale if row == column else ZERO
+        return self.view()[key]
+
+    def __repr__(self):
+        return repr(self.view())
+
+    def __str__(self):
+        return str(self.view())
+
+    def __array_function__(self, function, types, args, kwargs):
+        if function in (np.transpose, np.copy):
+            return self
+        if function in (np.shape, np.ndim):
+            return function(self.view())
+        return function(*(np.asarray(arg) if isinstance(arg, Diagonal) else arg for arg in args), **kwargs)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, out=None, **kwargs):
+        if method == "__call__" and not kwargs:
+            if ufunc is np.matmul and len(inputs) == 2:
+                result = self.product(*inputs)
+            elif ufunc in ELEMENTWISE_UFUNCS:
+                result = self.elementwise(ufunc, inputs, out)
+            else:
+                result = None
+            if result is not None:
+                if out is not None and result is not out[0]:
+                    out[0][...] = result
+                    return out[0]
+                return result
+        inputs = tuple(np.asarray(value) if isinstance(value, Diagonal) else value for value in inputs)
+        if out is not None:
+            kwargs["out"] = tuple(np.asarray(value) if isinstance(value, Diagonal) else value for value in out)
+        return getattr(ufunc, method)(*inputs, **kwargs)
+
+    def elementwise(self, ufunc, inputs, out):
+        # The same ufunc on a zero for each Diagonal gives everything off the diagonal, on its
+        # scale the diagonal. None leaves it to the dense matrices.
+        for value in inputs:
+            if isinstance(value, (Diagonal, np.ndarray)):
+                if value.shape != self.shape:
+                    return None
+            elif np.ndim(value) != 0:
+                return None
+        arrays = [value for value in inputs if isinstance(value, np.ndarray)]
+        indices = np.arange(self.dimension)
+        diagonal = ufunc(*(value.scale if type(value) is Diagonal else
+                           value[indices, indices] if isinstance(value, np.ndarray) else value for value in inputs))
+        zero = np.float64(0.0)
+        off = [zero if type(value) is Diagonal else value for value in inputs]
+        if not arrays:
+            rest = ufunc(*off)
+            if rest == 0 and not np.signbit(rest) and np.ndim(diagonal) == 0:
+                return Diagonal(self.dimension, diagonal)
+            result = spill.full(self.shape, rest)
+        else:
+            result = ufunc(*off, out=out[0] if out is not None and out[0].shape == self.shape else None)
+        result[indices, indices] = diagonal
+        return result
+
+    def product(self, left, right):
+        # The other side scaled. A matrix product sums into a +0.0, which turns a -0.0 into
+        # +0.0 and leaves every other number alone.
+        if type(left) is Diagonal and type(right) is Diagonal:
+            if left.dimension != right.dimension or not is_finite([left.scale, right.scale]):
+                return None
+            return Diagonal(self.dimension, left.scale * right.scale + 0.0)
+        if type(left) is Diagonal:
+            matrix, axis = right, 0
+        else:
+            matrix, axis = left, -1
+        if (not isinstance(matrix, np.ndarray) or matrix.ndim not in (1, 2) or matrix.shape[axis] != self.dimension
+                or matrix.dtype.kind not in "iuf" or not is_finite(self.scale) or not is_finite(matrix)):
+            return None
+        result = matrix * self.scale
+        return np.add(result, 0.0, out=result)
@@ -0,0 +1,188 @@
+import numpy as np
+from abraham import Abraham
+from operators import binary_function, unary_function
+from visitor import NodeVisitor
+
+# Elementwise operators and the ufunc each one ends up calling for two same-shaped arrays.
+# "+" and "-" are elementwise too once the TypeChecker has made sure the shapes agree.
+BINARY_UFUNCS = {
+    ".+": np.add,
+    ".-": np.subtract,
+    ".*": np.multiply,
+    "./": np.divide,
+    "+": np.add,
+    "-": np.subtract,
+}
+
+UNARY_UFUNCS = {
+    "-": np.negative,
+}
+
+# Elements per operand in one block. A block of every operand and of the output stays in
+# the cache while all the operations run over it.
+BLOCK_SIZE = 32768
+
+def is_matrix(symbol):
+    return symbol is not None and symbol.shape != (1, ) and symbol.type == "float"
+
+def is_elementwise(node):
+    if isinstance(node, Abraham.BinOp):
+        return node.operator in BINARY_UFUNCS and is_matrix(node.symbol)
+    if isinstance(node, Abraham.UnaryOp):
+        return node.operator in UNARY_UFUNCS and is_matrix(node.symbol)
+    return False
+
+
+# Evaluates a tree of elementwise operations. Float arrays of one shape and dtype are written
+# with out=, in blocks of rows for large ones; anything else goes through the engines' operator
+# functions. The ufuncs are the same, so results match the unfused expression bit for bit.
+class Kernel:
+
+    def __init__(self, node):
+        self.operands = []
+        self.operations = 0
+        self.tree = self.build(node)
+
+    def build(self, node):
+        if isinstance(node, Abraham.BinOp) and is_elementwise(node):
+            self.operations += 1
+            left = self.build(node.left)
+            right = self.build(node.right)
+            return ("binary", BINARY_UFUNCS[node.operator], binary_function(node), left, right)
+        if isinstance(node, Abraham.UnaryOp) and is_elementwise(node):
+            self.operations += 1
+            return ("unary", UNARY_UFUNCS[node.operator], unary_function(node), self.build(node.operand))
+        self.operands.append(node)
+        return ("operand", len(self.operands) - 1)
+
+    def __call__(self, values):
+        first = values[0]
+        if type(first) is not np.ndarray or first.dtype.kind != "f" or first.ndim == 0:
+            return self.evaluate(self.tree, values)
+        for value in values:
+            if type(value) is not np.ndarray or value.shape != first.shape or value.dtype != first.dtype:
+                return self.evaluate(self.tree, values)
+
+        out = np.empty(first.shape, first.dtype)
+        rows = max(1, BLOCK_SIZE * first.shape[0] // max(first.size, 1))
+        if rows >= first.shape[0]:
+            self.fill(self.tree, values, out)
+            return out
+        for start in range(0, first.shape[0], rows):
+            block = slice(start, start + rows)
+            self.fill(self.tree, [value[block] for value in values], out[block])
+        return out
+
+    def evaluate(self, tree, values):
+        if tree[0] == "operand":
+            return values[tree[1]]
+        if tree[0] == "unary":
+            return tree[2](self.evaluate(tree[3], values))
+        return tree[2](self.evaluate(tree[3], values), self.evaluate(tree[4], values))
+
+    def fill(self, tree, values, out):
+        # Writes the value of `tree` into `out` and returns the array holding the value,
+        # which for a lone operand is the operand itself
+        if tree[0] == "operand":
+            return values[tree[1]]
+        if tree[0] == "unary":
+            return tree[1](self.fill(tree[3], values, out), out=out)
+        _, ufunc, _, left, right = tree
+        if right[0] == "operand":
+            return ufunc(self.fill(left, values, out), values[right[1]], out=out)
+        if left[0] == "operand":
+            return ufunc(values[left[1]], self.fill(right, values, out), out=out)
+        left_value = self.fill(left, values, out)
+        right_value = self.fill(right, values, np.empty_like(out))
+        return ufunc(left_value, right_value, out=out)
+
+
+# Runs every expression of two or more elementwise operations on float matrices as one Kernel
+class Fuser(NodeVisitor):
+
+    def __init__(self, optimizer):
+        # Changes go into the Optimizer's report
+        self.optimizer = optimizer
+
+    def fuse(self, root):
+        return self.visit(root)
+
+    # ====== Statements ======
+
+    def visit_StatementList(self, node):
+        node.content = [self.visit(statement) for statement in node.content]
+        return node
+
+    def visit_AssignStatement(self, node):
+        node.right = self.visit(node.right)
+        return node
+
+    def visit_If(self, node):
+        node.condition = self.visit(node.condition)
+        node.block = self.visit(node.block)
+        if node.else_block is not None:
+            node.else_block = self.visit(node.else_block)
+        return node
+
+    def visit_While(self, node):
+        node.condition = self.visit(node.condition)
+        node.block = self.visit(node.block)
+        return node
+
+    def visit_For(self, node):
+        node.range = self.visit(node.range)
+        node.block = self.visit(node.block)
+        return node
+
+    def visit_Return(self, node):
+        node.value = self.visit(node.value)
+        return node
+
+    # ====== Expressions ======
+
+    def fused(self, node):
+        if not is_elementwise(node):
+            return None
+        kernel = Kernel(node)
+        if kernel.operations < 2:
+            return None
+        for position, operand in enumerate(kernel.operands):
+            kernel.operands[position] = self.visit(operand)
+        self.optimizer.change(node, f"fused {kernel.operations} elementwise operations in {self.optimizer.render(node)}")
+        fused = Abraham.Fused(operands=kernel.operands, kernel=kernel, expression=node, lineno=node.lineno)
+        fused.symbol = node.symbol
+        return fused
+
+    def visit_BinOp(self, node):
+        fused = self.fused(node)
+        if fused is not None:
+            return fused
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        return node
+
+    def visit_UnaryOp(self, node):
+        fused = self.fused(node)
+        if fused is not None:
+            return fused
+        node.operand = self.visit(node.operand)
+        return node
+
+    def visit_ExpressionList(self, node):
+        node.content = [self.visit(element) for element in node.content]
+        return node
+
+    def visit_Vector(self, node):
+        node.content = self.visit(node.content)
+        return node
+
+    def visit_FunctionCall(self, node):
+        node.arguments = self.visit(node.arguments)
+        return node
+
+    def visit_Memo(self, node):
+        node.value = self.visit(node.value)
+        return node
+
+    def generic_visit(self, node):
+        return node
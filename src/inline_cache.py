@@ -0,0 +1,96 @@
+import operator
+from sys import stderr
+import numpy as np
+from abraham import Abraham
+
+# Once the operands are arrays the ufunc behind an operator gives the same result without
+# going through the operator protocol first
+ARRAY_HANDLERS = {
+    operator.add: np.add,
+    operator.sub: np.subtract,
+    operator.mul: np.multiply,
+    operator.truediv: np.true_divide,
+    operator.matmul: np.matmul,
+    operator.eq: np.equal,
+    operator.ne: np.not_equal,
+    operator.gt: np.greater,
+    operator.ge: np.greater_equal,
+    operator.lt: np.less,
+    operator.le: np.less_equal,
+}
+
+# A node whose operand types keep changing stops being specialized
+MAX_DEOPTIMIZATIONS = 8
+
+def kind(value_type):
+    if value_type is np.ndarray:
+        return "ndarray"
+    return value_type.__name__
+
+def specialize(function, left_type, right_type):
+    if left_type is np.ndarray or right_type is np.ndarray:
+        return ARRAY_HANDLERS.get(function, function)
+    return function
+
+
+# The handler a BinOp node uses for the operand types it saw last. A hit calls it directly,
+# a miss specializes the node again, until it turns megamorphic and keeps the general function.
+class InlineCache:
+    __slots__ = ("function", "left", "right", "handler", "hits", "misses", "deoptimizations", "megamorphic")
+
+    def __init__(self, function):
+        self.function = function
+        self.left = None
+        self.right = None
+        self.handler = function
+        self.hits = 0
+        self.misses = 0
+        self.deoptimizations = 0
+        self.megamorphic = False
+
+    def miss(self, left_value, right_value):
+        self.misses += 1
+        if not self.megamorphic:
+            if self.left is not None:
+                self.deoptimizations += 1
+                self.megamorphic = self.deoptimizations >= MAX_DEOPTIMIZATIONS
+            if self.megamorphic:
+                self.left = self.right = None
+                self.handler = self.function
+            else:
+                self.left, self.right = type(left_value), type(right_value)
+                self.handler = specialize(self.function, self.left, self.right)
+        return self.function(left_value, right_value)
+
+    def describe(self):
+        if self.megamorphic:
+            return "megamorphic"
+        if self.left is None:
+            return "-"
+        return f"{kind(self.left)} x {kind(self.right)}"
+
+
+def binary_nodes(node):
+    if isinstance(node, Abraham.BinOp):
+        yield node
+    if isinstance(node, Abraham.Node):
+        for value in vars(node).values():
+            yield from binary_nodes(value)
+    elif isinstance(node, list):
+        for element in node:
+            yield from binary_nodes(element)
+
+def report(root, top=20, file=stderr):
+    caches = [(node, node.inline_cache) for node in binary_nodes(root) if node.inline_cache is not None]
+    hits = sum(cache.hits for _, cache in caches)
+    total = hits + sum(cache.misses for _, cache in caches)
+    rate = hits / total if total else 0.0
+    print(f"\nInline caches: {len(caches)} BinOp nodes, {hits} hits in {total} executions ({rate:.1%})", file=file)
+    if not caches:
+        return
+    print(f"{'line':>6}  {'operator':<10}{'operand types':<20}{'hits':>10}{'misses':>8}{'deopts':>8}{'hit rate':>10}", file=file)
+    caches.sort(key=lambda entry: entry[1].hits + entry[1].misses, reverse=True)
+    for node, cache in caches[:top]:
+        executions = cache.hits + cache.misses
+        print(f"{node.lineno or '?':>6}  {node.operator:<10}{cache.describe():<20}{cache.hits:>10}"
+              f"{cache.misses:>8}{cache.deoptimizations:>8}{cache.hits / executions:>10.1%}", file=file)
@@ -1,12 +1,28 @@
 from visitor import NodeVisitor
-from memory import Memory, MemoryStack
+from memory import FrameStack
 import numpy as np
-from control_statements import ReturnException, BreakException, ContinueException
+from control_statements import ReturnSignal, BREAK, CONTINUE
 from abraham import Abraham
+from operators import (
+    ASSIGN_OPERATORS, BUILTINS, assign_function, binary_function, copy, is_block, share, shares, slices,
+    unary_function, unshared,
+)
+from ranges import Range
+from resolver import Resolver
+from inline_cache import InlineCache
 
 class Interpreter(NodeVisitor):
     def __init__(self):
-        self.memory_stack = MemoryStack(Memory(name="global"))
+        self.frame_stack = None
+        self.visitors = {}
+
+    def visit(self, node):
+        # Dispatch on the node class is looked up once per class, not built from its name
+        visitor = self.visitors.get(node.__class__)
+        if visitor is None:
+            visitor = getattr(self, "visit_" + node.__class__.__name__, self.generic_visit)
+            self.visitors[node.__class__] = visitor
+        return visitor(node)
 
     def error(self, message: str) -> None:
         print(f"RuntimeError: {message}")
@@ -16,93 +32,168 @@ class Interpreter(NodeVisitor):
         exit()
 
     def interpret(self, root):
-        self.visit(root)
+        # Variables are read and written by the (depth, slot) positions the Resolver assigned
+        self.frame_stack = FrameStack(Resolver().resolve(root))
+        self.execute(root)
         print("\nMemory dump:")
-        self.memory_stack.dump_memory()
+        self.frame_stack.dump_memory()
+
+    def load(self, slot):
+        if slot is None:
+            return None
+        depth, index = slot
+        return self.frame_stack.frames[depth][index]
+
+    def store(self, slot, value):
+        depth, index = slot
+        self.frame_stack.frames[depth][index] = value
 
     def check_indices(self, matrix, args):
         shape = matrix.shape
         for bound, index in zip(shape, args):
-            if index < 0 or index >= bound:
+            if type(index) is Range:
+                # A block must lie inside the matrix, numpy would quietly cut it short
+                if index.start < 0 or index.start > index.stop or index.stop > bound:
+                    self.panic("Index out of bounds.")
+            elif index < 0 or index >= bound:
                 self.panic("Index out of bounds.")
  
-    def set_lvalue(self, node, value):
+    def proved(self, node):
+        # Indices BoundsChecks proved before the loop aren't checked again. The guard is
+        # always a variable, read straight from its slot.
+        guard = node.in_bounds
+        if guard is None:
+            return False
+        depth, index = guard.slot
+        return self.frame_stack.frames[depth][index]
+
+    def set_lvalue(self, node, value, proved=False):
         is_identifier = isinstance(node, Abraham.Identifier)
         is_subscript = isinstance(node, Abraham.BinOp) and node.operator == "SUBSCRIPT"
 
         if is_identifier:
-            self.memory_stack.insert(node.name, value)
+            self.store(node.slot, value)
         if is_subscript:
-            matrix = self.memory_stack.get(node.left.name)
             args = self.visit(node.right)
-            self.check_indices(matrix, args)
-            matrix[*args] = value
+            matrix = self.stored_matrix(node.left.slot)
+            if not proved:
+                self.check_indices(matrix, args)
+            if is_block(node):
+                matrix[slices(args)] = value
+            else:
+                matrix[*args] = value
+
+    def stored_matrix(self, slot):
+        # Copy on write: a shared matrix is replaced by its own copy before elements change
+        matrix = unshared(self.load(slot))
+        self.store(slot, matrix)
+        return matrix
+
+    def execute(self, node):
+        # The value of an expression statement is thrown away, only signals go up
+        signal = self.visit(node)
+        return None if isinstance(node, Abraham.Expression) else signal
+
+    def visit_StatementList(self, node):
+        for statement in node.content:
+            signal = self.execute(statement)
+            if signal is not None:
+                return signal
 
     def visit_AssignStatement(self, node):
         value = self.visit(node.right)
         if node.operator == "=":
-            self.set_lvalue(node.left, value)
+            if isinstance(node.left, Abraham.Identifier) and shares(node.right):
+                value = share(value)
+            self.set_lvalue(node.left, value, self.proved(node))
+            return
+
+        if isinstance(node.left, Abraham.Identifier):
+            # Straight from the frame, a matrix only the variable holds is updated in place
+            slot = node.left.slot
+            self.store(slot, assign_function(node)(self.load(slot), value))
+            return
+
+        # The indices are evaluated once for the read and the store
+        args = self.visit(node.left.right)
+        matrix = self.stored_matrix(node.left.left.slot)
+        original = binary_function(node.left)(matrix, args)
+        if not self.proved(node):
+            self.check_indices(matrix, args)
+        if is_block(node.left):
+            matrix[slices(args)] = ASSIGN_OPERATORS[node.operator](original, value)
+        else:
+            matrix[*args] = ASSIGN_OPERATORS[node.operator](original, value)
+
+    # Scopes the Resolver elided because they declare nothing are never pushed
+    def enter_scope(self, frame):
+        if not frame.elided:
+            self.frame_stack.push(frame)
+
+    def leave_scope(self, frame, signal):
+        # A return leaves the scopes it passes through on the stack, they show up in the memory dump
+        if isinstance(signal, ReturnSignal):
+            if frame.elided:
+                self.frame_stack.restore(frame)
             return
-        
-        original = self.visit(node.left)
-        if node.operator == "+=":
-            self.set_lvalue(node.left, original + value)
-        if node.operator == "-=":        
-            self.set_lvalue(node.left, original - value)
-        if node.operator == "*=":        
-            self.set_lvalue(node.left, original * value)
-        if node.operator == "/=":        
-            self.set_lvalue(node.left, original / value)
+        if not frame.elided:
+            self.frame_stack.pop()
 
     def visit_If(self, node):
-        self.memory_stack.push(Memory(name="if"))
-        try:
-            if self.visit(node.condition):
-                self.visit(node.block)
-            elif node.else_block is not None: 
-                self.visit(node.else_block)
-        except (BreakException, ContinueException) as e:
-            self.memory_stack.pop()
-            raise e
-        self.memory_stack.pop()
+        self.enter_scope(node.frame)
+        signal = None
+        if self.visit(node.condition):
+            signal = self.execute(node.block)
+        elif node.else_block is not None: 
+            signal = self.execute(node.else_block)
+        self.leave_scope(node.frame, signal)
+        return signal
     
     def visit_While(self, node):
-        self.memory_stack.push(Memory(name="while"))
+        self.enter_scope(node.frame)
         while self.visit(node.condition):
-            try:
-                self.visit(node.block)
-            except BreakException:
-                break
-            except ContinueException:
-                continue    
-        self.memory_stack.pop()
+            signal = self.execute(node.block)
+            if signal is not None:
+                if signal is BREAK:
+                    break
+                if signal is CONTINUE:
+                    continue
+                self.leave_scope(node.frame, signal)
+                return signal
+        self.leave_scope(node.frame, None)
 
     def visit_For(self, node):
-        self.memory_stack.push(Memory(name="for"))
-        for i in self.visit(node.range):
-            try:
-                self.memory_stack.insert(node.iterator, i)
-                self.visit(node.block)
-            except BreakException:
-                break
-            except ContinueException:
-                continue    
-        self.memory_stack.pop()
+        self.enter_scope(node.frame)
+        iterable = self.visit(node.range)
+        if shares(node.range):
+            # The rows of a matrix are views of it
+            share(iterable)
+        for i in iterable:
+            self.store(node.iterator_slot, i)
+            signal = self.execute(node.block)
+            if signal is not None:
+                if signal is BREAK:
+                    break
+                if signal is CONTINUE:
+                    continue
+                self.leave_scope(node.frame, signal)
+                return signal
+        self.leave_scope(node.frame, None)
 
     def visit_Return(self, node):
-        raise ReturnException(self.visit(node.right))
+        return ReturnSignal(self.visit(node.value))
 
     def visit_Control(self, node):
         if node.type == "break":
-            raise BreakException()
+            return BREAK
         if node.type == "continue":
-            raise ContinueException()
+            return CONTINUE
 
     def visit_ExpressionList(self, node):
         return [self.visit(elem) for elem in node.content]
 
     def visit_Identifier(self, node):
-        return self.memory_stack.get(node.name)
+        return self.load(node.slot)
 
     def visit_Numericek(self, node):
         return node.value
@@ -110,6 +201,25 @@ class Interpreter(NodeVisitor):
     def visit_String(self, node):
         return node.value[1:-1]
 
+    def visit_Constant(self, node):
+        if isinstance(node.value, np.ndarray):
+            return copy(node.value)
+        return node.value
+
+    def visit_Memo(self, node):
+        if node.lazy:
+            value = self.load(node.slot)
+            if value is not None:
+                return value
+        value = self.visit(node.value)
+        if shares(node.value):
+            share(value)
+        self.store(node.slot, value)
+        return value
+
+    def visit_Fused(self, node):
+        return node.kernel([self.visit(operand) for operand in node.operands])
+
     def visit_Vector(self, node):
         return np.array([self.visit(elem) for elem in node.content.content])
 
@@ -122,50 +232,19 @@ class Interpreter(NodeVisitor):
             return
 
         size = self.visit(node.arguments.content[0])
-        match node.name:
-            case "eye":
-                return np.eye(size)
-            case "ones":
-                return np.ones((size, size))
-            case "zeros":
-                return np.zeros(size)
+        return BUILTINS[node.name](size)
 
     def visit_BinOp(self, node):
         left_value = self.visit(node.left)
         right_value = self.visit(node.right)
-        # Retarded solution
-        match node.operator:
-            case "+":
-                return left_value + right_value
-            case "-":
-                return left_value - right_value
-            case "*":
-                return left_value @ right_value
-            case "/":
-                return left_value / right_value
-            case ".+":
-                return np.add(left_value, right_value)
-            case ".-":
-                return np.subtract(left_value, right_value)
-            case ".*":
-                return left_value * right_value
-            case "./":
-                return np.divide(left_value, right_value)
-            case ">":
-                return left_value > right_value
-            case ">=":
-                return left_value >= right_value
-            case "<":
-                return left_value < right_value
-            case "<=":
-                return left_value <= right_value
-            case ":":
-                return range(left_value, right_value)
-            case "SUBSCRIPT":
-                return left_value[*right_value]
-
+        # Quickened: the node keeps a handler for the operand types it saw last
+        cache = node.inline_cache
+        if cache is not None and type(left_value) is cache.left and type(right_value) is cache.right:
+            cache.hits += 1
+            return cache.handler(left_value, right_value)
+        if cache is None:
+            cache = node.inline_cache = InlineCache(binary_function(node))
+        return cache.miss(left_value, right_value)
 
     def visit_UnaryOp(self, node):
-        # operand: 'Abraham.Expression'
-        # operator: Operator
-        pass
+        return unary_function(node)(self.visit(node.operand))
@@ -1,22 +1,83 @@
-from sys import argv, stderr
-from lech import Lech
-from patryk import Patryk
-from type_checker import TypeChecker
+from argparse import ArgumentParser, ArgumentTypeError
+from sys import stderr
+from ast_cache import AstCache
 from interpreter import Interpreter
+from closure_compiler import ClosureCompiler
+from vm import VirtualMachine
+from optimizer import Optimizer
+from bounds import BoundsChecks
+from code_motion import CodeMotion
+from fusion import Fuser
+from matrix_chain import MatrixChains
+from vectorizer import Vectorizer
+from profiler import Profiler, PROFILING_ENGINES
+import inline_cache
+import spill
 
-def main():
-    if len(argv) <= 1:
-        print("No source file specified\nUsage: python3 main.py <source file>", file=stderr)
-        exit(1) 
-    
-    filename = argv[1]
+ENGINES = {
+    "interpreter": Interpreter,
+    "closure": ClosureCompiler,
+    "vm": VirtualMachine,
+}
+
+def memory_size(text):
+    # Bytes, with an optional K, M or G suffix
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
     try:
-        source_file = open(filename, "r")
-    except IOError:
-        print(f"Cannot open \"{filename}\"", file=stderr)
-        exit(1)
+        if text[-1:].upper() in units:
+            return int(float(text[:-1]) * units[text[-1].upper()])
+        return int(text)
+    except ValueError:
+        raise ArgumentTypeError(f"invalid size: {text!r}")
 
-    text = source_file.read()
+def parse_arguments():
+    parser = ArgumentParser(prog="main.py")
+    parser.add_argument("source", help="source file")
+    parser.add_argument("--engine", choices=ENGINES.keys(), default="interpreter",
+                        help="execution engine (default: interpreter)")
+    parser.add_argument("--disassemble", action="store_true",
+                        help="print the bytecode the vm engine would run and exit")
+    parser.add_argument("--dump-grammar", metavar="FILE", nargs="?", const="parser.out",
+                        help="write the grammar and LALR states to FILE (default: parser.out)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always lex, parse and type check the source instead of using the AST cache")
+    parser.add_argument("-O", "--optimize", action="store_true",
+                        help="fold constant expressions, remove code that can never run, reuse "
+                             "loop-invariant and repeated expressions, fuse elementwise matrix expressions and "
+                             "check the indices of element assignments in for loops once per loop")
+    parser.add_argument("--opt-report", action="store_true",
+                        help="optimize like -O and list every change on stderr")
+    parser.add_argument("--vectorize", action="store_true",
+                        help="turn independent counted loops into numpy array operations "
+                             "(floating-point sums may differ in the last bits)")
+    parser.add_argument("--reorder-products", action="store_true",
+                        help="multiply chains of matrix products in the cheapest order and drop eye() factors "
+                             "(floating-point results may differ in the last bits)")
+    parser.add_argument("--memory-limit", metavar="SIZE", type=memory_size,
+                        help="keep matrices larger than SIZE bytes (K, M and G suffixes work) in memory-mapped "
+                             "files and run operations on them block by block")
+    parser.add_argument("--scratch-dir", metavar="DIR",
+                        help="directory for the files of --memory-limit (default: the system temporary directory)")
+    parser.add_argument("--profile", action="store_true",
+                        help="count executions and time of every node and report the hottest lines on stderr "
+                             "(interpreter and closure engines)")
+    parser.add_argument("--profile-output", metavar="FILE", default="profile.collapsed",
+                        help="collapsed stacks for flamegraph tools written by --profile (default: profile.collapsed)")
+    parser.add_argument("--inline-cache-stats", action="store_true",
+                        help="report the hits and misses of the BinOp inline caches on stderr (interpreter engine)")
+    arguments = parser.parse_args()
+    if arguments.profile and arguments.engine not in PROFILING_ENGINES:
+        parser.error(f"--profile is not supported by the {arguments.engine} engine")
+    if arguments.inline_cache_stats and arguments.engine != "interpreter":
+        parser.error(f"--inline-cache-stats is not supported by the {arguments.engine} engine, "
+                     "it resolves operators when compiling")
+    return arguments
+
+def frontend(text):
+    # Imported here so that a cache hit never loads the lexer, the parser or their tables
+    from lech import Lech
+    from patryk import Patryk
+    from type_checker import TypeChecker
 
     lexer = Lech()
     tokens = lexer.tokenize(text)
@@ -27,10 +88,85 @@ def main():
     ast = parser.get_ast(tokens)
     type_checker = TypeChecker()
     if type_checker.check(ast) != 0:
+        return None, False
+    return ast, lexer.errors_total == 0 and parser.errors_total == 0
+
+def main():
+    arguments = parse_arguments()
+    if arguments.memory_limit is not None:
+        # Before anything builds a matrix, the Optimizer folds some ahead of time
+        spill.configure(arguments.memory_limit, arguments.scratch_dir)
+
+    filename = arguments.source
+    try:
+        source_file = open(filename, "r")
+    except IOError:
+        print(f"Cannot open \"{filename}\"", file=stderr)
+        exit(1)
+
+    text = source_file.read()
+
+    if arguments.dump_grammar:
+        from patryk import Patryk
+        Patryk.dump_grammar(arguments.dump_grammar)
+
+    cache = None if arguments.no_cache else AstCache()
+    ast = cache.load(text) if cache is not None else None
+    if ast is not None:
+        # Only sources that compiled without any diagnostics are cached
+        print("Found 0 syntax errors.")
+    else:
+        ast, cacheable = frontend(text)
+        if ast is None:
+            return
+        if cache is not None and cacheable:
+            cache.store(text, ast)
+
+    optimizer = None
+    if arguments.optimize or arguments.opt_report:
+        optimizer = Optimizer()
+
+    if arguments.reorder_products:
+        # Before folding, which turns eye() calls into constants
+        ast = MatrixChains(optimizer).reorder(ast)
+
+    if optimizer is not None:
+        ast = optimizer.optimize(ast)
+
+    if arguments.vectorize:
+        ast = Vectorizer().vectorize(ast)
+
+    if optimizer is not None:
+        # After the Vectorizer, which would give up on loops holding Memo nodes
+        ast = CodeMotion(optimizer).optimize(ast)
+        ast = Fuser(optimizer).fuse(ast)
+        ast = BoundsChecks(optimizer).eliminate(ast)
+        if arguments.opt_report:
+            optimizer.report()
+
+    if arguments.disassemble:
+        VirtualMachine().disassemble(ast)
         return
 
-    interpreter = Interpreter()
-    interpreter.interpret(ast)
+    try:
+        if arguments.profile:
+            profile(ast, text, arguments)
+        else:
+            interpreter = ENGINES[arguments.engine]()
+            interpreter.interpret(ast)
+    finally:
+        if arguments.inline_cache_stats:
+            inline_cache.report(ast)
+
+def profile(ast, text, arguments):
+    profiler = Profiler()
+    interpreter = PROFILING_ENGINES[arguments.engine](profiler)
+    try:
+        interpreter.interpret(ast)
+    finally:
+        # Runtime errors leave through exit(), the profile up to that point is still reported
+        profiler.report(text)
+        profiler.write_collapsed(arguments.profile_output)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -53,8 +53,8 @@ class Lech(Lexer):
 
     # String containing ignored characters between tokens
     ignore = " \t"
-    ignore_newline = "\#.*"
-    ignore_comment = "\n+"
+    ignore_comment = r"\#.*"
+    ignore_newline = r"\n+"
 
     # Identifiers
     ID = r"[a-zA-Z_][a-zA-Z0-9_]*"
@@ -122,8 +122,11 @@ class Lech(Lexer):
     def ignore_newline(self, t):
         self.lineno += t.value.count("\n")
 
+    errors_total: int = 0
+
     def error(self, t):
         print(f"Illegal character '{t.value[0]}' at {self.lineno}", file=stderr)
+        self.errors_total += 1
         self.index += 1
 
 
@@ -0,0 +1,164 @@
+from abraham import Abraham
+from symbol_table import Symbol
+from visitor import NodeVisitor
+
+def is_product(node):
+    # A matrix product, "*" of two scalars is an ordinary multiplication
+    return (isinstance(node, Abraham.BinOp) and node.operator == "*"
+            and node.symbol is not None and node.symbol.shape != (1, ))
+
+def is_identity(node):
+    return (isinstance(node, Abraham.FunctionCall) and node.name == "eye"
+            and isinstance(node.arguments.content[0], Abraham.Numericek))
+
+def shape(node):
+    # Rows and columns, None unless the TypeChecker knows it's a matrix or a vector: a vector
+    # literal is (n, 1), its transpose (1, n). A range can have a length only known at run time.
+    symbol = node.symbol
+    if symbol is None or len(symbol.shape) != 2 or None in symbol.shape:
+        return None
+    return symbol.shape
+
+def order(dimensions):
+    # Classic dynamic programming over the chain: cost[i][j] is the fewest scalar
+    # multiplications for factors i..j, split[i][j] where the last product happens
+    count = len(dimensions) - 1
+    cost = [[0] * count for _ in range(count)]
+    split = [[0] * count for _ in range(count)]
+    for length in range(2, count + 1):
+        for i in range(count - length + 1):
+            j = i + length - 1
+            cost[i][j] = None
+            for k in range(i, j):
+                candidate = cost[i][k] + cost[k + 1][j] + dimensions[i] * dimensions[k + 1] * dimensions[j + 1]
+                if cost[i][j] is None or candidate < cost[i][j]:
+                    cost[i][j] = candidate
+                    split[i][j] = k
+    return cost[0][count - 1], split
+
+
+# Multiplies every chain of products of known-shape matrices in the order with the fewest
+# scalar multiplications, dropping eye(n) factors. A different order may round differently.
+# Runs before the Optimizer, which would fold the eye() calls into constants.
+class MatrixChains(NodeVisitor):
+
+    def __init__(self, optimizer=None):
+        # Changes go into the Optimizer's report when there is one
+        self.optimizer = optimizer
+
+    def reorder(self, root):
+        return self.visit(root)
+
+    def change(self, node, message):
+        if self.optimizer is not None:
+            self.optimizer.change(node, message)
+
+    def factors(self, node):
+        if is_product(node):
+            return self.factors(node.left) + self.factors(node.right)
+        return [node]
+
+    def cost(self, node):
+        # Scalar multiplications the chain takes as written
+        if not is_product(node):
+            return 0
+        rows, inner = shape(node.left)
+        return self.cost(node.left) + self.cost(node.right) + rows * inner * shape(node.right)[1]
+
+    def product(self, left, right, lineno):
+        node = Abraham.BinOp(left=left, right=right, operator="*", lineno=lineno)
+        node.symbol = Symbol(type=left.symbol.type, shape=(shape(left)[0], shape(right)[1]))
+        return node
+
+    def build(self, factors, split, i, j, lineno):
+        if i == j:
+            return factors[i]
+        k = split[i][j]
+        return self.product(self.build(factors, split, i, k, lineno), self.build(factors, split, k + 1, j, lineno), lineno)
+
+    def chain(self, node):
+        factors = self.factors(node)
+        shapes = [shape(factor) for factor in factors]
+        if None in shapes or any(left[1] != right[0] for left, right in zip(shapes, shapes[1:])):
+            return None
+        kept = [factor for factor in factors if not is_identity(factor)] or factors[:1]
+        # A vector is a 1-D array at run time, which numpy multiplies as a row on the left and
+        # as a column on the right. Only at the ends of the chain does that mean the same in
+        # every order.
+        if any(1 in shape(factor) for factor in kept[1:-1]):
+            return None
+        dimensions = [shape(factor)[0] for factor in kept] + [shape(kept[-1])[1]]
+        best, split = order(dimensions)
+        if len(kept) == len(factors) and best >= self.cost(node):
+            return None
+
+        text = self.optimizer.render(node) if self.optimizer is not None else None
+        kept = [self.visit(factor) for factor in kept]
+        chain = self.build(kept, split, 0, len(kept) - 1, node.lineno)
+        if self.optimizer is not None:
+            dropped = len(factors) - len(kept)
+            identities = f", dropped {dropped} eye() factor{'s' if dropped > 1 else ''}" if dropped else ""
+            self.change(node, f"multiplied {text} as {self.optimizer.render(chain)}{identities}, "
+                              f"{best} instead of {self.cost(node)} scalar multiplications")
+        return chain
+
+    # ====== Statements ======
+
+    def visit_StatementList(self, node):
+        node.content = [self.visit(statement) for statement in node.content]
+        return node
+
+    def visit_AssignStatement(self, node):
+        node.right = self.visit(node.right)
+        return node
+
+    def visit_If(self, node):
+        node.condition = self.visit(node.condition)
+        node.block = self.visit(node.block)
+        if node.else_block is not None:
+            node.else_block = self.visit(node.else_block)
+        return node
+
+    def visit_While(self, node):
+        node.condition = self.visit(node.condition)
+        node.block = self.visit(node.block)
+        return node
+
+    def visit_For(self, node):
+        node.range = self.visit(node.range)
+        node.block = self.visit(node.block)
+        return node
+
+    def visit_Return(self, node):
+        node.value = self.visit(node.value)
+        return node
+
+    # ====== Expressions ======
+
+    def visit_BinOp(self, node):
+        if is_product(node):
+            chain = self.chain(node)
+            if chain is not None:
+                return chain
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        return node
+
+    def visit_UnaryOp(self, node):
+        node.operand = self.visit(node.operand)
+        return node
+
+    def visit_ExpressionList(self, node):
+        node.content = [self.visit(element) for element in node.content]
+        return node
+
+    def visit_Vector(self, node):
+        node.content = self.visit(node.content)
+        return node
+
+    def visit_FunctionCall(self, node):
+        node.arguments = self.visit(node.arguments)
+        return node
+
+    def generic_visit(self, node):
+        return node
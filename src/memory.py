@@ -1,47 +1,43 @@
-class Memory:
+# Variables made up by the optimizer start with "$", which no identifier can. They never
+# show up in a memory dump.
+def is_hidden(name):
+    return name.startswith("$")
 
-    def __init__(self, name):
+# Every engine keeps variables in frames, at the fixed (depth, slot) positions the Resolver
+# gives them, instead of looking them up by name. A frame is a plain preallocated list.
+# Scopes that declare no names are elided: they never get a frame, depth is where it would be.
+class FrameLayout:
+
+    def __init__(self, name, names, depth=0, elided=False):
         self.name = name
-        self.lookup = {}
-    
-    def has_key(self, name):
-        return name in self.lookup.keys()
-
-    def get(self, name):
-        if self.has_key(name):
-            return self.lookup[name]
-        raise None
-
-    def put(self, name, value):
-        # Here overrides are allowed in contrast to the symbol table
-        self.lookup[name] = value
-
-# Tbh we're forced to use this. 
-# I structured the symbol table also as a stack for the purpouses of name-shadowings
-class MemoryStack:
-                                                                             
-    def __init__(self, initial_memory=None):
-        self.stack = [initial_memory]
-
-    def get(self, name):       
-        memory = next((mem for mem in self.stack[::-1] if mem.has_key(name)), None) 
-        if memory is None:
-            return None
-        return memory.get(name)
-
-    def insert(self, name, value):
-        memory = next((mem for mem in self.stack[::-1] if mem.has_key(name)), None) 
-        if memory is None:
-            self.stack[-1].put(name, value)
-        else:
-            memory.put(name, value)
-
-    def push(self, memory):
-        self.stack.append(memory)
+        self.names = names
+        self.depth = depth
+        self.elided = elided
+
+    def new_frame(self):
+        return [None] * len(self.names)
+
+class FrameStack:
+
+    def __init__(self, initial_layout):
+        self.layouts = [initial_layout]
+        self.frames = [initial_layout.new_frame()]
+
+    def push(self, layout):
+        self.layouts.append(layout)
+        self.frames.append(layout.new_frame())
 
     def pop(self):
-        return self.stack.pop()
-    
+        self.layouts.pop()
+        return self.frames.pop()
+
+    def restore(self, layout):
+        # A return keeps the frames it leaves on the stack for the dump, elided ones included
+        self.layouts.insert(layout.depth, layout)
+        self.frames.insert(layout.depth, layout.new_frame())
+
     def dump_memory(self):
-        for mem in self.stack:
-            print(mem.name, mem.lookup)
\ No newline at end of file
+        # Unassigned slots are skipped, a variable shows up once it has been assigned
+        for layout, frame in zip(self.layouts, self.frames):
+            print(layout.name, {name: value for name, value in zip(layout.names, frame)
+                              if value is not None and not is_hidden(name)})
@@ -0,0 +1,229 @@
+import operator
+import numpy as np
+from abraham import Abraham
+from diagonal import Diagonal
+from ranges import Range
+import spill
+from spill import Spilled
+
+# Every engine resolves operator strings through these tables, so the tree-walking
+# interpreter and the compiled backends can't drift apart.
+
+def slices(indices):
+    # Ranges become basic slices: a block is read as a view and written in one operation
+    return tuple(slice(index.start, index.stop) if type(index) is Range else index for index in indices)
+
+BINARY_OPERATORS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.matmul,
+    "/": operator.truediv,
+    ".+": np.add,
+    ".-": np.subtract,
+    ".*": operator.mul,
+    "./": np.divide,
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "and": operator.and_,
+    "or": operator.or_,
+    "xor": operator.xor,
+    ":": Range,
+    "SUBSCRIPT": lambda matrix, indices: matrix[*indices],
+    # A subscript with a range among its indices, see is_block
+    "SLICE": lambda matrix, indices: matrix[slices(indices)],
+}
+
+UNARY_OPERATORS = {
+    "-": operator.neg,
+    "'": np.transpose,
+}
+
+def divide(left, right):
+    # Division by zero follows IEEE like it does on NumPy numbers: inf or nan and a
+    # RuntimeWarning, where plain Python numbers would raise ZeroDivisionError
+    try:
+        return left / right
+    except ZeroDivisionError:
+        return np.float64(left) / right
+
+def unbox(value):
+    # Elements leave a matrix as plain Python numbers
+    return value.item() if isinstance(value, np.generic) else value
+
+# Operands the TypeChecker knows to be single numbers are plain Python ints, floats and bools,
+# so the elementwise operators don't need NumPy's dispatch, "*" is an ordinary product and
+# a transpose does nothing. Elements read from a matrix are unboxed.
+SCALAR_TYPES = {"int", "float", "bool"}
+
+SCALAR_BINARY_OPERATORS = {
+    **BINARY_OPERATORS,
+    "*": operator.mul,
+    "/": divide,
+    ".+": operator.add,
+    ".-": operator.sub,
+    "./": divide,
+    "SUBSCRIPT": lambda matrix, indices: unbox(matrix[*indices]),
+}
+
+SCALAR_UNARY_OPERATORS = {
+    "-": operator.neg,
+    "'": lambda value: value,
+}
+
+def is_scalar(symbol):
+    return symbol is not None and symbol.shape == (1, ) and symbol.type in SCALAR_TYPES
+
+def is_block(node):
+    # A subscript that selects a block of the matrix with ranges, `A[0:2, 1]`
+    return node.operator == "SUBSCRIPT" and any(
+        isinstance(index, Abraham.BinOp) and index.operator == ":" for index in node.right.content)
+
+# Nodes without a symbol (made by later passes) take the general tables
+def binary_function(node):
+    if is_block(node):
+        return BINARY_OPERATORS["SLICE"]
+    if is_scalar(node.symbol):
+        return SCALAR_BINARY_OPERATORS[node.operator]
+    return BINARY_OPERATORS[node.operator]
+
+def unary_function(node):
+    if is_scalar(node.symbol):
+        return SCALAR_UNARY_OPERATORS[node.operator]
+    return UNARY_OPERATORS[node.operator]
+
+ASSIGN_OPERATORS = {
+    "+=": operator.add,
+    "-=": operator.sub,
+    "*=": operator.mul,
+    "/=": divide,
+}
+
+# Matrices have value semantics, copy on write: `B = A` shares the array, and whichever
+# variable is written first gets its own copy. Every other operation makes a new matrix, so
+# a matrix gets a second holder only where shares() says so. share() marks it read-only
+# there, a view's matrix too, and from then on every holder copies it before writing.
+
+def shares(node):
+    # Whether storing the expression's value can give a matrix something already holds, or
+    # a view of one, a second holder
+    if is_scalar(node.symbol):
+        return False
+    if isinstance(node, (Abraham.Identifier, Abraham.Memo)):
+        return True
+    if isinstance(node, Abraham.UnaryOp):
+        return node.operator == "'"
+    return isinstance(node, Abraham.BinOp) and node.operator == "SUBSCRIPT"
+
+def share(value):
+    if type(value) in (np.ndarray, Spilled):
+        value.flags.writeable = False
+        if type(value.base) in (np.ndarray, Spilled):
+            value.base.flags.writeable = False
+    return value
+
+def unshared(matrix):
+    # The matrix to store elements into, called with the variable's value and stored back
+    if type(matrix) is Diagonal:
+        return matrix.dense()
+    if type(matrix) is Range:
+        return np.asarray(matrix)
+    if type(matrix) is np.ndarray and (matrix.base is not None or not matrix.flags.writeable):
+        return matrix.copy()
+    if type(matrix) is Spilled and (not spill.owns(matrix) or not matrix.flags.writeable):
+        return spill.copy(matrix)
+    return matrix
+
+def fits(original, value):
+    # The result has the matrix's own dtype and shape, so it can be written over it
+    try:
+        return (np.result_type(original, value) == original.dtype
+                and np.broadcast_shapes(original.shape, np.shape(value)) == original.shape)
+    except (TypeError, ValueError, OverflowError):
+        # Left to the operator, which fails the same way it always did
+        return False
+
+def in_place(function, ufunc):
+    # A matrix that isn't shared is updated with `out=`, anything else gets a new array
+    def update(original, value):
+        if (type(original) is np.ndarray and original.base is None and original.flags.writeable
+                and fits(original, value)):
+            return ufunc(original, value, out=original)
+        if (type(original) is Spilled and spill.owns(original) and original.flags.writeable
+                and fits(original, value)):
+            return ufunc(original, value, out=original)
+        return function(original, value)
+    return update
+
+# Compound assignments to variables that aren't always scalars
+IN_PLACE_OPERATORS = {
+    "+=": in_place(operator.add, np.add),
+    "-=": in_place(operator.sub, np.subtract),
+    "*=": in_place(operator.mul, np.multiply),
+    "/=": in_place(operator.truediv, np.true_divide),
+}
+
+def assign_function(node):
+    if is_scalar(node.left.symbol):
+        return ASSIGN_OPERATORS[node.operator]
+    return IN_PLACE_OPERATORS[node.operator]
+
+def arange(values):
+    # The Vectorizer's iterator: int64 when it proved nothing computed from it overflows,
+    # Python ints otherwise
+    bounds, fits = values
+    return np.arange(bounds.start, bounds.stop, dtype=None if fits else object)
+
+def magnitude(value):
+    # At least 1, floats are 1: see Vectorizer.magnitude
+    return max(abs(int(value)), 1) if isinstance(value, (int, np.integer)) else 1
+
+def reduce_sum(values):
+    if values.dtype == object:
+        return sum(values.tolist())
+    # int64 can't wrap around when every element is small enough for their number, otherwise
+    # the sum is done exactly with Python ints
+    if values.dtype.kind == "i" and len(values) and (
+            max(-int(values.min()), int(values.max())) >= np.iinfo(np.int64).max // len(values)):
+        return sum(values.tolist())
+    return values.sum().item()
+
+def copy(matrix):
+    # A matrix in a file is copied into a file of its own, not into memory
+    return spill.copy(matrix) if type(matrix) is Spilled else matrix.copy()
+
+def shape(matrix):
+    # A Range or a Diagonal becomes an array of the same shape when an element is stored
+    return matrix.shape if type(matrix) in (np.ndarray, Spilled, Range, Diagonal) else None
+
+def in_bounds(values):
+    # Whether every value of the indices lies inside a matrix of the shape, an index that is
+    # a range stands for all of its values. See BoundsChecks.
+    shape, *indices = values
+    if shape is None or len(indices) > len(shape):
+        return False
+    for bound, index in zip(shape, indices):
+        if type(index) is Range:
+            if index and (index.start < 0 or index.stop > bound):
+                return False
+        elif index < 0 or index >= bound:
+            return False
+    return True
+
+BUILTINS = {
+    "eye": Diagonal,
+    "ones": lambda size: spill.ones((size, size)),
+    "zeros": lambda size: spill.zeros((size, size)),
+    # Not reachable from the grammar, the optimizing passes emit these
+    "arange": arange,
+    "magnitude": magnitude,
+    "sum": reduce_sum,
+    "copy": copy,
+    "shape": shape,
+    "in_bounds": in_bounds,
+    # The vm engine's copy on write
+    "share": share,
+}
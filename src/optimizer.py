@@ -0,0 +1,257 @@
+from sys import stderr
+import numpy as np
+from abraham import Abraham
+from diagonal import Diagonal
+from operators import BINARY_OPERATORS, BUILTINS, binary_function, unary_function
+from resolver import Resolver
+from visitor import NodeVisitor
+
+# Ranges stay as they are, the Vectorizer and the engines look for the `a:b` form
+FOLDED_OPERATORS = set(BINARY_OPERATORS) - {":"}
+FOLDED_FUNCTIONS = {"eye", "ones", "zeros"}
+
+# Larger matrices are still built at run time, a constant is kept for the whole run even
+# when the code that needs it never executes
+MAX_FOLDED_SIZE = 4096
+
+def describe(value):
+    if isinstance(value, (np.ndarray, Diagonal)):
+        return f"<{'x'.join(map(str, value.shape))} {value.dtype} matrix>"
+    return str(value)
+
+def contains_return(node):
+    if isinstance(node, Abraham.Return):
+        return True
+    if isinstance(node, Abraham.StatementList):
+        return any(contains_return(statement) for statement in node.content)
+    if isinstance(node, Abraham.If):
+        return contains_return(node.block) or (node.else_block is not None and contains_return(node.else_block))
+    if isinstance(node, (Abraham.While, Abraham.For)):
+        return contains_return(node.block)
+    return False
+
+
+# Folds constant subexpressions with the engines' operator tables and drops code that can
+# never run: the dead branch of a constant if, a while(false), statements after a break,
+# continue or return. An expression that would fail is left for run time.
+class Optimizer(NodeVisitor):
+
+    def __init__(self):
+        self.changes = []
+        # id of a folded node -> (node, its source text, index of its line in changes)
+        self.folds = {}
+
+    def optimize(self, root):
+        # The scope analysis decides which branches can be inlined
+        Resolver().resolve(root)
+        return self.visit(root)
+
+    def change(self, node, message):
+        self.changes.append((node.lineno, message))
+
+    def report(self, file=stderr):
+        changes = [change for change in self.changes if change is not None]
+        print(f"\nOptimizer made {len(changes)} changes:", file=file)
+        for lineno, message in changes:
+            print(f"{lineno or '?':>6}: {message}", file=file)
+
+    def render(self, node):
+        # Source-like text of an expression, folded parts are shown as they were written
+        if id(node) in self.folds:
+            return self.folds[id(node)][1]
+        if isinstance(node, Abraham.Numericek):
+            return repr(node.value)
+        if isinstance(node, Abraham.Constant):
+            return describe(node.value)
+        if isinstance(node, Abraham.String):
+            return node.value
+        if isinstance(node, Abraham.Identifier):
+            return node.name
+        if isinstance(node, Abraham.Memo):
+            return self.render(node.value)
+        if isinstance(node, Abraham.Fused):
+            return self.render(node.expression)
+        if isinstance(node, Abraham.BinOp):
+            if node.operator == "SUBSCRIPT":
+                return f"{self.render(node.left)}[{self.render(node.right)}]"
+            return f"({self.render(node.left)} {node.operator} {self.render(node.right)})"
+        if isinstance(node, Abraham.UnaryOp):
+            if node.operator == "'":
+                return f"{self.render(node.operand)}'"
+            return f"{node.operator}{self.render(node.operand)}"
+        if isinstance(node, Abraham.ExpressionList):
+            return ", ".join(self.render(element) for element in node.content)
+        if isinstance(node, Abraham.Vector):
+            return f"[{self.render(node.content)}]"
+        if isinstance(node, Abraham.FunctionCall):
+            return f"{node.name}({self.render(node.arguments)})"
+        return node.__class__.__name__
+
+    # ====== Constants ======
+
+    def is_constant(self, node):
+        return isinstance(node, (Abraham.Numericek, Abraham.Constant))
+
+    def constant(self, value, original):
+        # Plain numbers keep being literals, everything else needs the more general node
+        if type(value) in (int, float):
+            folded = Abraham.Numericek(value=value)
+        else:
+            folded = Abraham.Constant(value=value)
+        folded.symbol = original.symbol
+        folded.lineno = original.lineno
+        return folded
+
+    def fold(self, node, operands, evaluate):
+        try:
+            with np.errstate(all="raise"):
+                value = evaluate()
+        except Exception:
+            # Left for run time, where the error (or numpy's warning) belongs
+            return node
+        text = self.render(node)
+        folded = self.constant(value, node)
+        # A fold that takes in earlier folds replaces their lines in the report
+        for operand in operands:
+            if id(operand) in self.folds:
+                self.changes[self.folds.pop(id(operand))[2]] = None
+        self.folds[id(folded)] = (folded, text, len(self.changes))
+        self.change(node, f"folded {text} to {describe(value)}")
+        return folded
+
+    # ====== Statements ======
+
+    def visit_StatementList(self, node):
+        content = []
+        for position, statement in enumerate(node.content):
+            statement = self.visit(statement)
+            if statement is None:
+                continue
+            if isinstance(statement, Abraham.StatementList):
+                content.extend(statement.content)
+            else:
+                content.append(statement)
+            # An inlined branch can end in a jump too
+            last = content[-1] if content else None
+            if isinstance(last, (Abraham.Control, Abraham.Return)):
+                unreachable = len(node.content) - position - 1
+                if unreachable:
+                    kind = last.type if isinstance(last, Abraham.Control) else "return"
+                    plural = "s" if unreachable > 1 else ""
+                    self.change(node.content[position + 1], f"removed {unreachable} unreachable statement{plural} after {kind}")
+                break
+        node.content = content
+        return node
+
+    def visit_block(self, block):
+        block = self.visit(block)
+        return block if block is not None else Abraham.StatementList(content=[], lineno=None)
+
+    def visit_AssignStatement(self, node):
+        node.right = self.visit(node.right)
+        if not isinstance(node.left, Abraham.Identifier):
+            node.left = self.visit(node.left)
+        return node
+
+    def visit_If(self, node):
+        node.condition = self.visit(node.condition)
+        node.block = self.visit_block(node.block)
+        if node.else_block is not None:
+            node.else_block = self.visit_block(node.else_block)
+
+        if not self.is_constant(node.condition):
+            return node
+        try:
+            taken = bool(node.condition.value)
+        except Exception:
+            return node
+
+        block = node.block if taken else node.else_block
+        condition = self.render(node.condition)
+        if block is None:
+            self.change(node, f"removed if {condition}, its condition is always false")
+            return None
+        # Inlined only where the memory dump can't tell: the scope was elided and no return goes
+        # through it. Otherwise the branch that's left stays inside an `if (true)`.
+        if node.frame.elided and not contains_return(block):
+            self.change(node, f"inlined the {'true' if taken else 'else'} branch of if {condition}")
+            return block
+        if not taken or node.else_block is not None:
+            self.change(node, f"removed the {'else' if taken else 'true'} branch of if {condition}")
+        node.condition = self.constant(True, node.condition)
+        node.block = block
+        node.else_block = None
+        return node
+
+    def visit_While(self, node):
+        node.condition = self.visit(node.condition)
+        node.block = self.visit_block(node.block)
+        if self.is_constant(node.condition):
+            try:
+                running = bool(node.condition.value)
+            except Exception:
+                return node
+            if not running:
+                self.change(node, f"removed while {self.render(node.condition)}, its condition is always false")
+                return None
+        return node
+
+    def visit_For(self, node):
+        node.range = self.visit(node.range)
+        node.block = self.visit_block(node.block)
+        return node
+
+    def visit_Return(self, node):
+        node.value = self.visit(node.value)
+        return node
+
+    def visit_Control(self, node):
+        return node
+
+    # ====== Expressions ======
+
+    def visit_BinOp(self, node):
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        if node.operator not in FOLDED_OPERATORS:
+            return node
+        if node.operator == "SUBSCRIPT":
+            if not self.is_constant(node.left) or not all(self.is_constant(index) for index in node.right.content):
+                return node
+            indices = [index.value for index in node.right.content]
+            return self.fold(node, [node.left, *node.right.content],
+                             lambda: binary_function(node)(node.left.value, indices))
+        if not self.is_constant(node.left) or not self.is_constant(node.right):
+            return node
+        function = binary_function(node)
+        return self.fold(node, [node.left, node.right], lambda: function(node.left.value, node.right.value))
+
+    def visit_UnaryOp(self, node):
+        node.operand = self.visit(node.operand)
+        if not self.is_constant(node.operand):
+            return node
+        function = unary_function(node)
+        return self.fold(node, [node.operand], lambda: function(node.operand.value))
+
+    def visit_FunctionCall(self, node):
+        node.arguments = self.visit(node.arguments)
+        if node.name not in FOLDED_FUNCTIONS or len(node.arguments.content) != 1:
+            return node
+        size = node.arguments.content[0]
+        if not isinstance(size, Abraham.Numericek) or not isinstance(size.value, int):
+            return node
+        if size.value * size.value > MAX_FOLDED_SIZE:
+            return node
+        function = BUILTINS[node.name]
+        return self.fold(node, [size], lambda: function(size.value))
+
+    def visit_ExpressionList(self, node):
+        node.content = [self.visit(element) for element in node.content]
+        return node
+
+    def visit_Vector(self, node):
+        node.content = self.visit(node.content)
+        return node
+
+    def generic_visit(self, node):
+        return node
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+import sly
+from sly import Parser
+from sly.yacc import YaccError
+
+# Bump whenever the layout of the cached file changes
+CACHE_VERSION = 1
+
+CACHE_DIRECTORY = Path(__file__).parent / "__pycache__"
+
+
+class CachedTables:
+    # The parts of sly's LRTable that Parser.parse reads
+    def __init__(self, lr_action, lr_goto, defaulted_states):
+        self.lr_action = lr_action
+        self.lr_goto = lr_goto
+        self.defaulted_states = defaulted_states
+
+
+# Keeps the LALR tables on disk, keyed on a hash of the grammar, instead of building them
+# every time the class is defined
+class CachedParser(Parser):
+
+    # sly calls _build from the metaclass, for this class itself there is nothing to build
+    @classmethod
+    def _build(cls, definitions):
+        if vars(cls).get('_build', False):
+            return
+
+        rules = cls._Parser__collect_rules(definitions)
+        if not cls._Parser__validate_specification():
+            raise YaccError('Invalid parser specification')
+        cls._Parser__build_grammar(rules)
+
+        cls._lrtable = cls.load_tables()
+        if cls._lrtable is None:
+            cls.build_tables()
+            cls.save_tables()
+
+    @classmethod
+    def build_tables(cls):
+        if not cls._Parser__build_lrtables():
+            raise YaccError('Can\'t build parsing tables')
+
+    @classmethod
+    def grammar_hash(cls):
+        grammar = cls._grammar
+        description = [
+            f"cache {CACHE_VERSION}",
+            f"sly {sly.__version__}",
+            *(str(production) for production in grammar.Productions),
+            *(f"{term} {assoc} {level}" for term, (assoc, level) in sorted(grammar.Precedence.items())),
+        ]
+        return hashlib.sha256("\n".join(description).encode()).hexdigest()
+
+    @classmethod
+    def cache_path(cls):
+        return CACHE_DIRECTORY / f"{cls.__name__.lower()}.{cls.grammar_hash()[:16]}.lalr"
+
+    @classmethod
+    def load_tables(cls):
+        try:
+            with open(cls.cache_path(), "rb") as cache_file:
+                cached = pickle.load(cache_file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return None
+
+        if not isinstance(cached, dict) or cached.get("hash") != cls.grammar_hash():
+            return None
+        return CachedTables(cached["lr_action"], cached["lr_goto"], cached["defaulted_states"])
+
+    @classmethod
+    def save_tables(cls):
+        table = cls._lrtable
+        cached = {
+            "hash": cls.grammar_hash(),
+            "lr_action": table.lr_action,
+            "lr_goto": table.lr_goto,
+            "defaulted_states": table.defaulted_states,
+        }
+        # A read-only install still works, it just rebuilds the tables every time
+        try:
+            CACHE_DIRECTORY.mkdir(exist_ok=True)
+            # Written to a temporary file first so concurrent runs never see half a cache
+            descriptor, temporary = tempfile.mkstemp(dir=CACHE_DIRECTORY, suffix=".tmp")
+            with os.fdopen(descriptor, "wb") as cache_file:
+                pickle.dump(cached, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, cls.cache_path())
+        except OSError:
+            pass
+
+    @classmethod
+    def dump_grammar(cls, filename):
+        # The cached tables don't carry the state descriptions, so they're rebuilt for the dump
+        if isinstance(cls._lrtable, CachedTables):
+            cls.build_tables()
+        with open(filename, 'w') as f:
+            f.write(str(cls._grammar))
+            f.write('\n')
+            f.write(str(cls._lrtable))
+        cls.log.info('Parser debugging for %s written to %s', cls.__qualname__, filename)
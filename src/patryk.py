@@ -1,5 +1,5 @@
 from sys import stderr
-from sly import Parser
+from parser_cache import CachedParser
 from sly.yacc import YaccProduction as Production
 from lech import Lech
 from abraham import Abraham
@@ -7,11 +7,9 @@ from sly.lex import Token
 from pprint import pprint
 from dataclasses import asdict
 
-class Patryk(Parser):
+class Patryk(CachedParser):
     tokens = Lech.tokens
 
-    debugfile = 'parser.out'
-
     precedence = (
         ('right', ASSIGN, PLUS_ASSIGN, MINUS_ASSIGN, TIMES_ASSIGN, DIVIDE_ASSIGN),
         ('nonassoc', RANGE),
@@ -37,8 +35,11 @@ class Patryk(Parser):
     # ====== Expressions ======
 
     # Binary arythmetic expressions
+    @_('"(" expression ")"')
+    def expression(self, p: Production) -> Production:
+        return p[1]
+
     @_(
-        '"(" expression ")"',
         'expression PLUS          expression',
         'expression MINUS         expression',
         'expression TIMES         expression',
@@ -53,6 +54,7 @@ class Patryk(Parser):
             left=p[0],
             right=p[2],
             operator=p[1],
+            lineno=p.lineno,
         )
     
     # Binary relation expressions
@@ -69,6 +71,7 @@ class Patryk(Parser):
             left=p[0],
             right=p[2],
             operator=p[1],
+            lineno=p.lineno,
         )
 
     # Binary logical expression
@@ -82,24 +85,25 @@ class Patryk(Parser):
             left=p[0],
             right=p[2],
             operator=p[1],
+            lineno=p.lineno,
         )
 
     # Value expressions
     @_('FLOAT')
     def expression(self, p: Production) -> Production:
-        return Abraham.Numericek(value=float(p[0]))
+        return Abraham.Numericek(value=float(p[0]), lineno=p.lineno)
     
     @_('INTEGER')
     def expression(self, p: Production) -> Production:
-        return Abraham.Numericek(value=int(p[0]))
+        return Abraham.Numericek(value=int(p[0]), lineno=p.lineno)
     
     @_('STRING')
     def expression(self, p: Production) -> Production:
-        return Abraham.String(value=str(p[0]))
+        return Abraham.String(value=str(p[0]), lineno=p.lineno)
     
     @_('ID')
     def expression(self, p: Production) -> Production:
-        return Abraham.Identifier(name=str(p[0]))
+        return Abraham.Identifier(name=str(p[0]), lineno=p.lineno)
     
     # Unary operators
     @_('MINUS expression %prec UNARY_MINUS')
@@ -107,13 +111,15 @@ class Patryk(Parser):
         return Abraham.UnaryOp(
             operand=p[1],
             operator=p[0],
+            lineno=p.lineno,
         )
     
     @_('expression TRANSPOSE %prec TRANSPOSE')
     def expression(self, p: Production) -> Production:
         return Abraham.UnaryOp(
-            operand=p[1],
-            operator=p[0],
+            operand=p[0],
+            operator=p[1],
+            lineno=p.lineno,
         )
 
     # Range operator
@@ -123,6 +129,7 @@ class Patryk(Parser):
             left=p[0],
             right=p[2],
             operator=p[1],
+            lineno=p.lineno,
         )
 
     # Built-in functions
@@ -133,8 +140,10 @@ class Patryk(Parser):
         return Abraham.FunctionCall(
             name=p[0],
             arguments=Abraham.ExpressionList(
-                content=[p[2]]
-            )
+                content=[p[2]],
+                lineno=p.lineno,
+            ),
+            lineno=p.lineno,
         )
 
     # Subscript
@@ -144,16 +153,18 @@ class Patryk(Parser):
             left=p[0],
             right=p[2],
             operator="SUBSCRIPT",
+            lineno=p.lineno,
         )
 
     # ====== Expression list ======
     @_('expression')
     def expression_list(self, p: Production) -> Production:
-        return Abraham.ExpressionList(content=[p[0]])
+        return Abraham.ExpressionList(content=[p[0]], lineno=p.lineno)
     
     @_('expression_list "," expression')
     def expression_list(self, p: Production) -> Production:
-        return Abraham.ExpressionList(content=p[0].content + [p[2]])
+        p[0].content.append(p[2])
+        return p[0]
 
     @_('')
     def expression_list(self, p: Production) -> Production:
@@ -163,7 +174,7 @@ class Patryk(Parser):
 
     @_('"[" expression_list "]"')
     def vector(self, p: Production) -> Production:
-        return Abraham.Vector(content=p[1])
+        return Abraham.Vector(content=p[1], lineno=p.lineno)
     
     @_('vector')
     def expression(self, p: Production) -> Production:
@@ -180,7 +191,7 @@ class Patryk(Parser):
     @_('BREAK ";"',
        'CONTINUE ";"')
     def statement(self, p: Production) -> Production:
-        return Abraham.Control(type=p[0])
+        return Abraham.Control(type=p[0], lineno=p.lineno)
     
     # Built-in print
     @_('PRINT "(" expression_list ")" ";"')
@@ -188,12 +199,13 @@ class Patryk(Parser):
         return Abraham.FunctionCall(
             name=p[0],
             arguments=p[2],
+            lineno=p.lineno,
         )
 
     # Return statements
     @_('RETURN expression ";"')
     def statement(self, p: Production) -> Production:
-        return Abraham.Return(value=p[1])
+        return Abraham.Return(value=p[1], lineno=p.lineno)
     
     # Assignments
     @_(
@@ -208,6 +220,7 @@ class Patryk(Parser):
             left=p[0],
             right=p[2],
             operator=p[1],
+            lineno=p.lineno,
         )
 
     # Control statements
@@ -219,6 +232,7 @@ class Patryk(Parser):
             condition=p[2],
             block=p[4],
             else_block=None,
+            lineno=p.lineno,
         )
     
     @_(
@@ -229,6 +243,7 @@ class Patryk(Parser):
             condition=p[2],
             block=p[4],
             else_block=p[6],
+            lineno=p.lineno,
         )
     
     # Loops
@@ -237,6 +252,7 @@ class Patryk(Parser):
         return Abraham.While(
             condition=p[2],
             block=p[4],
+            lineno=p.lineno,
         )
     
     @_('FOR "(" ID ASSIGN expression ")" statement')
@@ -245,6 +261,7 @@ class Patryk(Parser):
             iterator=p[2],
             range=p[4],
             block=p[6],
+            lineno=p.lineno,
         )
 
     # ====== Statement List ======
@@ -253,22 +270,29 @@ class Patryk(Parser):
         if isinstance(p[1], Abraham.StatementList):
             return p[1]
         else:
-            return Abraham.StatementList(content=[p[1]])
+            return Abraham.StatementList(content=[p[1]], lineno=p.lineno)
 
     @_('statement')
     def statement_list(self, p: Production):
         if isinstance(p[0], Abraham.StatementList):
             return p[0]
         else:
-            return Abraham.StatementList(content=[p[0]])
+            return Abraham.StatementList(content=[p[0]], lineno=p.lineno)
     
+    # The list on the left is always one built by these two rules, so it's extended in place
+    # instead of being copied on every reduction
     @_('statement_list statement')
     def statement_list(self, p: Production):
-        list0 = p[0].content if isinstance(p[0], Abraham.StatementList) else [p[0]]
-        list1 = p[1].content if isinstance(p[1], Abraham.StatementList) else [p[1]]
-        return Abraham.StatementList(content=list0+list1)
+        if isinstance(p[1], Abraham.StatementList):
+            p[0].content.extend(p[1].content)
+        else:
+            p[0].content.append(p[1])
+        return p[0]
     
+    errors_total: int = 0
+
     def error(self, token: Token) -> None:
+        self.errors_total += 1
         if not token:
             print("SyntaxError: End of file reached", file = stderr)
             return
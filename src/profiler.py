@@ -0,0 +1,126 @@
+from collections import defaultdict
+from sys import stderr
+from time import perf_counter
+from interpreter import Interpreter
+from closure_compiler import ClosureCompiler
+
+
+class NodeStats:
+    def __init__(self, node, lineno):
+        self.node = node
+        self.lineno = lineno
+        self.count = 0
+        self.total = 0.0
+        self.own = 0.0
+
+    def describe(self):
+        name = self.node.__class__.__name__
+        operator = getattr(self.node, "operator", None)
+        if operator is not None:
+            return f"{name}({operator})"
+        if hasattr(self.node, "name") and isinstance(self.node.name, str):
+            return f"{name}({self.node.name})"
+        return name
+
+
+# Counts every AST node's executions and its time with its children (total) and without
+# (own). Nodes the compiler made up count towards the line of the node that contains them.
+class Profiler:
+
+    def __init__(self):
+        self.stats = {}
+        self.stack = []
+        self.collapsed = defaultdict(float)
+
+    def enter(self, node):
+        stats = self.stats.get(id(node))
+        if stats is None:
+            parent = self.stack[-1][0] if self.stack else None
+            lineno = node.lineno if node.lineno is not None else parent.lineno if parent else None
+            stats = self.stats[id(node)] = NodeStats(node, lineno)
+        path = self.stack[-1][1] if self.stack else ()
+        path = (*path, f"{stats.describe()}:{stats.lineno}")
+        # [stats, stack path, start time, time spent in children]
+        self.stack.append([stats, path, perf_counter(), 0.0])
+
+    def exit(self):
+        stats, path, start, children = self.stack.pop()
+        elapsed = perf_counter() - start
+        stats.count += 1
+        stats.total += elapsed
+        stats.own += elapsed - children
+        self.collapsed[path] += elapsed - children
+        if self.stack:
+            self.stack[-1][3] += elapsed
+
+    def lines(self):
+        lines = defaultdict(lambda: [0, 0.0])
+        for stats in self.stats.values():
+            line = lines[stats.lineno]
+            # Every execution of a line runs its outermost node, that's the one counted
+            line[0] = max(line[0], stats.count)
+            line[1] += stats.own
+        return lines
+
+    def report(self, source, top=20, file=stderr):
+        source_lines = source.splitlines()
+        total = sum(stats.own for stats in self.stats.values()) or 1.0
+
+        print("\nHot lines:", file=file)
+        print(f"{'line':>6} {'hits':>10} {'own ms':>10} {'%':>6}  source", file=file)
+        lines = sorted(self.lines().items(), key=lambda item: item[1][1], reverse=True)
+        for lineno, (count, own) in lines[:top]:
+            text = source_lines[lineno - 1].strip() if lineno and lineno <= len(source_lines) else ""
+            print(f"{lineno or '?':>6} {count:>10} {own * 1000:>10.2f} {own / total:>6.1%}  {text}", file=file)
+
+        print("\nHot nodes:", file=file)
+        print(f"{'line':>6} {'count':>10} {'own ms':>10} {'total ms':>10} {'%':>6}  node", file=file)
+        nodes = sorted(self.stats.values(), key=lambda stats: stats.own, reverse=True)
+        for stats in nodes[:top]:
+            print(f"{stats.lineno or '?':>6} {stats.count:>10} {stats.own * 1000:>10.2f} "
+                  f"{stats.total * 1000:>10.2f} {stats.own / total:>6.1%}  {stats.describe()}", file=file)
+
+    def write_collapsed(self, filename):
+        # One "frame;frame;frame value" line per stack, values are microseconds of own time
+        with open(filename, "w") as collapsed_file:
+            for path, own in sorted(self.collapsed.items()):
+                microseconds = round(own * 1e6)
+                if microseconds > 0:
+                    collapsed_file.write(f"{';'.join(path)} {microseconds}\n")
+
+
+class ProfilingInterpreter(Interpreter):
+    def __init__(self, profiler):
+        super().__init__()
+        self.profiler = profiler
+
+    def visit(self, node):
+        self.profiler.enter(node)
+        try:
+            return super().visit(node)
+        finally:
+            self.profiler.exit()
+
+
+class ProfilingClosureCompiler(ClosureCompiler):
+    # Nodes run when their closure is called, so it's the closures that get wrapped
+    def __init__(self, profiler):
+        super().__init__()
+        self.profiler = profiler
+
+    def visit(self, node):
+        run = super().visit(node)
+        enter, exit = self.profiler.enter, self.profiler.exit
+        def profiled():
+            enter(node)
+            try:
+                return run()
+            finally:
+                exit()
+        return profiled
+
+
+PROFILING_ENGINES = {
+    "interpreter": ProfilingInterpreter,
+    "closure": ProfilingClosureCompiler,
+}
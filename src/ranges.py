@@ -0,0 +1,42 @@
+from math import ceil
+import numpy as np
+from numpy.lib.mixins import NDArrayOperatorsMixin
+
+# The value of `a:b`. A for loop iterates over it without an array behind it, arithmetic turns
+# it into np.arange(a, b). Storing into an element gives the variable its own array, see unshared.
+class Range(NDArrayOperatorsMixin):
+    __slots__ = ("start", "stop")
+
+    def __init__(self, start, stop):
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return max(0, ceil(self.stop - self.start))
+
+    @property
+    def shape(self):
+        return (len(self), )
+
+    def __iter__(self):
+        if type(self.start) is int and type(self.stop) is int:
+            return iter(range(self.start, self.stop))
+        return (self.start + k for k in range(len(self)))
+
+    def __getitem__(self, key):
+        if type(key) is tuple and len(key) == 1:
+            key = key[0]
+        if isinstance(key, (int, np.integer)) and not isinstance(key, bool):
+            # Counts from the end when negative, like a numpy vector
+            return self.start + range(len(self))[key]
+        if type(key) is slice and key.step in (None, 1):
+            part = range(len(self))[key]
+            return Range(self.start + part.start, self.start + part.stop)
+        return np.asarray(self)[key]
+
+    def __array__(self, dtype=None, copy=None):
+        values = np.arange(self.start, self.stop)
+        return values if dtype is None else values.astype(dtype, copy=False)
+
+    def __repr__(self):
+        return f"range({self.start}, {self.stop})"
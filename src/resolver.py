@@ -0,0 +1,126 @@
+from abraham import Abraham
+from memory import FrameLayout
+from symbol_table import SymbolTable
+from visitor import NodeVisitor
+
+# Gives every variable a fixed (depth, slot) position. Scopes follow the TypeChecker, a
+# scope that declares nothing gets no frame and its names resolve further out.
+class Resolver(NodeVisitor):
+    symbol_table: SymbolTable
+
+    def __init__(self):
+        self.symbol_table = SymbolTable(parent=None, name="global")
+        self.depth = 0
+        # ids of the scope nodes without declarations, found by the first pass
+        self.empty = set()
+        self.elided = set()
+
+    def resolve(self, ast_root) -> FrameLayout:
+        self.visit(ast_root)
+        self.elided = self.empty
+        self.symbol_table = SymbolTable(parent=None, name="global")
+        self.visit(ast_root)
+        return self.layout()
+
+    def layout(self):
+        return FrameLayout(self.symbol_table.name, list(self.symbol_table.lookup.keys()), self.depth)
+
+    def push_context(self, node, name):
+        if id(node) in self.elided:
+            return
+        self.symbol_table = self.symbol_table.push_context(name)
+        self.depth += 1
+
+    def pop_context(self, node, name):
+        if id(node) in self.elided:
+            return FrameLayout(name, [], self.depth + 1, elided=True)
+        layout = self.layout()
+        if not layout.names:
+            self.empty.add(id(node))
+        self.symbol_table = self.symbol_table.pop_context()
+        self.depth -= 1
+        return layout
+
+    def declare(self, name):
+        slot = self.symbol_table.get(name)
+        if slot is None:
+            slot = (self.depth, len(self.symbol_table.lookup))
+            self.symbol_table.put(name, slot)
+        return slot
+
+    def visit_AssignStatement(self, node):
+        self.visit(node.right)
+        if isinstance(node.left, Abraham.Identifier):
+            node.left.slot = self.declare(node.left.name)
+        else:
+            self.visit(node.left)
+        if node.in_bounds is not None:
+            self.visit(node.in_bounds)
+
+    def visit_If(self, node):
+        self.push_context(node, "if")
+        self.visit(node.condition)
+        self.visit(node.block)
+        if node.else_block is not None:
+            self.visit(node.else_block)
+        node.frame = self.pop_context(node, "if")
+
+    def visit_While(self, node):
+        self.push_context(node, "while")
+        self.visit(node.condition)
+        self.visit(node.block)
+        node.frame = self.pop_context(node, "while")
+
+    def visit_For(self, node):
+        self.push_context(node, "for")
+        self.visit(node.range)
+        node.iterator_slot = self.declare(node.iterator)
+        self.visit(node.block)
+        node.frame = self.pop_context(node, "for")
+
+    def visit_Return(self, node):
+        self.visit(node.value)
+
+    def visit_Control(self, node):
+        pass
+
+    def visit_Identifier(self, node):
+        node.slot = self.symbol_table.get(node.name)
+
+    def visit_Memo(self, node):
+        self.visit(node.value)
+        node.slot = self.declare(node.name)
+
+    def visit_Fused(self, node):
+        for operand in node.operands:
+            self.visit(operand)
+
+    def visit_Numericek(self, node):
+        pass
+
+    def visit_String(self, node):
+        pass
+
+    def visit_Constant(self, node):
+        pass
+
+    def visit_ExpressionList(self, node):
+        for elem in node.content:
+            self.visit(elem)
+
+    def visit_Vector(self, node):
+        self.visit(node.content)
+
+    def visit_Matrix(self, node):
+        for row in node.rows:
+            self.visit(row)
+
+    def visit_FunctionCall(self, node):
+        self.visit(node.arguments)
+
+    def visit_BinOp(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_UnaryOp(self, node):
+        self.visit(node.operand)
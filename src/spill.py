@@ -0,0 +1,139 @@
+import os
+import tempfile
+import numpy as np
+
+# Spill mode, off unless `configure` is called (--memory-limit): a matrix larger than `limit`
+# bytes lives in an np.memmap file in `directory`, so the operating system keeps only the
+# parts in use in memory.
+limit = None
+directory = None
+
+def configure(memory_limit, scratch_directory=None):
+    global limit, directory
+    limit = memory_limit
+    directory = scratch_directory or tempfile.gettempdir()
+
+def spills(shape, dtype):
+    return limit is not None and int(np.prod(shape)) * np.dtype(dtype).itemsize > limit
+
+def empty(shape, dtype=np.float64):
+    if not spills(shape, dtype):
+        return np.empty(shape, dtype)
+    descriptor, path = tempfile.mkstemp(suffix=".matrix", dir=directory)
+    os.close(descriptor)
+    mapping = np.memmap(path, dtype=dtype, mode="w+", shape=shape)
+    # The mapping keeps the data until the matrix is gone, nothing is left behind
+    os.unlink(path)
+    return mapping.view(Spilled)
+
+def full(shape, value):
+    if not spills(shape, np.float64):
+        return np.full(shape, value, dtype=np.float64)
+    # A new file reads as zeros already, +0.0 ones
+    matrix = empty(shape)
+    if value != 0 or np.signbit(value):
+        matrix.fill(value)
+    return matrix
+
+def zeros(shape):
+    return full(shape, 0.0)
+
+def ones(shape):
+    return full(shape, 1.0)
+
+def copy(matrix):
+    result = empty(matrix.shape, matrix.dtype)
+    for block in blocks(result):
+        result[block] = plain(matrix)[block]
+    return result
+
+def plain(value):
+    return value.view(np.ndarray) if isinstance(value, Spilled) else value
+
+def owns(matrix):
+    # A matrix made by `empty`, not a view of one
+    return isinstance(matrix.base, np.memmap)
+
+def blocks(matrix):
+    # Slices of whole rows, each a quarter of the limit at most
+    if matrix.ndim == 0 or not matrix.size:
+        yield ...
+        return
+    rows = matrix.shape[0]
+    step = max(1, (limit or matrix.nbytes) // 4 // max(matrix.nbytes // rows, 1))
+    for start in range(0, rows, step):
+        yield slice(start, start + step)
+
+
+# A matrix in an np.memmap file. Operations with one go through it block by block of rows,
+# a result larger than the limit goes into a file of its own.
+class Spilled(np.ndarray):
+
+    def __repr__(self):
+        return repr(plain(self))
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if isinstance(value, Spilled) and not spills(value.shape, value.dtype):
+            return np.array(value)
+        return value
+
+    def __setitem__(self, key, value):
+        # Straight into the mapped memory, never into the copy a read can give
+        plain(self)[key] = value
+
+    def __array_ufunc__(self, ufunc, method, *inputs, out=None, **kwargs):
+        # Values with operations of their own, a Diagonal, go first and get this one as it is
+        if any(hasattr(value, "__array_ufunc__") and not isinstance(value, np.ndarray) for value in inputs):
+            return NotImplemented
+        inputs = tuple(plain(value) for value in inputs)
+        target = out[0] if out is not None and len(out) == 1 else None
+        if method == "__call__" and not kwargs and ufunc.nout == 1 and (out is None or target is not None):
+            if ufunc is np.matmul:
+                result = self.product(*inputs, target)
+            else:
+                result = self.elementwise(ufunc, inputs, target)
+            if result is not None:
+                return result
+        if out is not None:
+            kwargs["out"] = tuple(plain(value) for value in out)
+        result = getattr(ufunc, method)(*inputs, **kwargs)
+        return out[0] if out is not None and len(out) == 1 else result
+
+    def elementwise(self, ufunc, inputs, target):
+        # None leaves it to numpy, for anything that isn't worth doing in blocks
+        arrays = [value for value in inputs if isinstance(value, np.ndarray)]
+        if not all(value.size for value in arrays):
+            return None
+        shape = np.broadcast_shapes(*(np.shape(value) for value in inputs))
+        if target is None:
+            # The first element of each operand gives the result dtype
+            with np.errstate(all="ignore"):
+                sample = ufunc(*(value[(0, ) * value.ndim] if isinstance(value, np.ndarray) else value
+                                 for value in inputs))
+            if not spills(shape, sample.dtype):
+                return None
+            target = empty(shape, sample.dtype)
+        if not shape or target.shape != shape:
+            return None
+        rows = shape[0]
+        for block in blocks(target):
+            ufunc(*(value[block] if np.ndim(value) == len(shape) and np.shape(value)[0] == rows else value
+                    for value in inputs), out=plain(target)[block])
+        return target
+
+    def product(self, left, right, target):
+        if (not isinstance(left, np.ndarray) or not isinstance(right, np.ndarray) or left.ndim != 2
+                or right.ndim not in (1, 2) or left.shape[1] != right.shape[0]):
+            return None
+        shape = left.shape[:1] + right.shape[1:]
+        if target is None:
+            dtype = np.result_type(left.dtype, right.dtype)
+            if not spills(shape, dtype):
+                return None
+            target = empty(shape, dtype)
+        if target.shape != shape:
+            return None
+        for block in blocks(target):
+            np.matmul(left[block], right, out=plain(target)[block])
+        return target
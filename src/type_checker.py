@@ -7,6 +7,7 @@ class TypeChecker(NodeVisitor):
 
     def __init__(self):
         self.symbol_table = SymbolTable(parent=None, name=None)
+        self.visitors = {}
 
     errors_total: int = 0
     
@@ -14,6 +15,18 @@ class TypeChecker(NodeVisitor):
         print(f"SyntaxError: {message}")
         self.errors_total += 1
 
+    def visit(self, node):
+        # Each node is checked exactly once and keeps its symbol, so later passes can read
+        # node.symbol instead of inferring it again. Large literal matrices have one node per
+        # element, so the visitor method is looked up once per node class.
+        visitor = self.visitors.get(node.__class__)
+        if visitor is None:
+            visitor = getattr(self, "visit_" + node.__class__.__name__, self.generic_visit)
+            self.visitors[node.__class__] = visitor
+        symbol = visitor(node)
+        node.symbol = symbol
+        return symbol
+
     def check(self, ast_root) -> None:
         self.errors_total = 0
         self.visit(ast_root)
@@ -39,25 +52,38 @@ class TypeChecker(NodeVisitor):
             self.symbol_table.put(id_name, Symbol(right.type, right.shape))
 
         left = self.visit(node.left)
-        if left != right:
+        # A block can be filled with a single number
+        fill = is_subscript and left is not None and right == Symbol(type=left.type, shape=(1, ))
+        if left != right and not fill:
             self.error("Left and right sides of an operator have different types or shapes")
 
     def visit_If(self, node):
         self.symbol_table = self.symbol_table.push_context("if")
+        self.visit(node.condition)
         self.visit(node.block)
         self.symbol_table = self.symbol_table.pop_context()
+        if node.else_block is not None:
+            # Names assigned in one branch aren't declared in the other
+            self.symbol_table = self.symbol_table.push_context("else")
+            self.visit(node.else_block)
+            self.symbol_table = self.symbol_table.pop_context()
 
     def visit_While(self, node):
         self.symbol_table = self.symbol_table.push_context("while")
+        self.visit(node.condition)
         self.visit(node.block)
         self.symbol_table = self.symbol_table.pop_context()
 
     def visit_For(self, node):
         self.symbol_table = self.symbol_table.push_context("for")
+        self.visit(node.range)
         self.symbol_table.put(node.iterator, Symbol(type="int", shape=(1, )))
         self.visit(node.block)
         self.symbol_table = self.symbol_table.pop_context()
 
+    def visit_Return(self, node):
+        self.visit(node.value)
+
     def visit_Control(self, node):
         if not self.symbol_table.is_looping():
             self.error("Control statement outside of a loop")
@@ -69,12 +95,25 @@ class TypeChecker(NodeVisitor):
         return node_type        
 
     def visit_BinOp(self, node):
+        if node.operator == "SUBSCRIPT" and any(self.is_range(index) for index in node.right.content):
+            return self.visit_block(node)
+
         symbol_left = self.visit(node.left)
         symbol_right = self.visit(node.right)
         if symbol_left is None or symbol_right is None:
             self.error(" Binary operation not possible when one side has an unknown type")
             return None
 
+        if node.operator == ":":
+            return self.visit_range(node, symbol_left, symbol_right)
+
+        # A single number goes with every element of the other side
+        if node.operator in [".+", ".-", ".*", "./"] and symbol_left.type == symbol_right.type:
+            if symbol_right.shape == (1, ):
+                return symbol_left
+            if symbol_left.shape == (1, ):
+                return symbol_right
+
         # TODO: A somewhat ugly solution
         if node.operator in [".+", ".-", ".*", "./", "==", "!=", "+", "-"]:
             if symbol_left != symbol_right:
@@ -89,12 +128,16 @@ class TypeChecker(NodeVisitor):
             if symbol_left.shape[-1] != symbol_right.shape[0]:
                 self.error("Incompatible shapes for multiplication")
                 return None
+            if symbol_left.shape == symbol_right.shape == (1, ):
+                return Symbol(type=symbol_left.type, shape=(1, ))
             return Symbol(type=symbol_left.type, shape=(symbol_left.shape[0], symbol_right.shape[-1]))
 
         if node.operator in [">=", ">", "<", "<=", "/"]:
             if symbol_left.shape != (1, ) or symbol_right.shape != (1, ):
                 self.error("Shape must be (1, ) for numerical comparison or division")
                 return None
+            if node.operator == "/":
+                return Symbol(type="float", shape=(1, ))
             return Symbol(type="bool", shape=(1, ))
 
         if node.operator in ["and", "or", "xor"]:
@@ -107,9 +150,62 @@ class TypeChecker(NodeVisitor):
             if not isinstance(node.left, Abraham.Identifier):
                 self.error("Subscript mus have and identifier to it' left")
                 return None
-            id = self.visit(node.left)
-            return Symbol(type=id.type, shape=(1, ))
+            return Symbol(type=symbol_left.type, shape=(1, ))
  
+    def is_range(self, node):
+        return isinstance(node, Abraham.BinOp) and node.operator == ":"
+
+    def range_length(self, node):
+        # Literal bounds `2:5`, or a start and `start + k` like `i:i + 2`
+        start, stop = node.left, node.right
+        if isinstance(start, Abraham.Numericek) and isinstance(stop, Abraham.Numericek):
+            return max(stop.value - start.value, 0)
+        if (isinstance(stop, Abraham.BinOp) and stop.operator == "+" and stop.left == start
+                and isinstance(stop.right, Abraham.Numericek)):
+            return max(stop.right.value, 0)
+        return None
+
+    def visit_range(self, node, symbol_left, symbol_right):
+        # A range is a vector like a vector literal, its length None unless range_length knows it
+        for symbol in (symbol_left, symbol_right):
+            if symbol.shape != (1, ) or symbol.type not in ("int", "float"):
+                self.error("Range bounds must be numbers")
+                return None
+        if symbol_left.type == symbol_right.type == "int":
+            return Symbol(type="int", shape=(self.range_length(node), 1))
+        return Symbol(type="float", shape=(None, 1))
+
+    def visit_block(self, node):
+        # A subscript with ranges reads a block: one dimension per range, the scalar indices
+        # drop theirs. A single one makes a vector, shaped like a vector literal.
+        symbol = self.visit(node.left)
+        if not isinstance(node.left, Abraham.Identifier):
+            self.error("Subscript mus have and identifier to it' left")
+            return None
+        shape = []
+        for index in node.right.content:
+            index_symbol = self.visit(index)
+            if not self.is_range(index):
+                if index_symbol != Symbol(type="int", shape=(1, )):
+                    self.error("Indices of a block subscript must be integers")
+                    return None
+                continue
+            for bound in (index.left, index.right):
+                if bound.symbol != Symbol(type="int", shape=(1, )):
+                    self.error("Range bounds must be integers")
+                    return None
+            length = self.range_length(index)
+            if length is None:
+                self.error("Range subscript needs a length known at compile time")
+                return None
+            shape.append(length)
+        if symbol is None or len(node.right.content) > len(symbol.shape):
+            self.error("Too many indices for the subscripted matrix")
+            return None
+        if len(shape) == 1:
+            shape.append(1)
+        return Symbol(type=symbol.type, shape=tuple(shape))
+
     def visit_UnaryOp(self, node):
         symbol =  self.visit(node.operand)
         if node.operator == "'":
@@ -117,9 +213,10 @@ class TypeChecker(NodeVisitor):
         return symbol
 
     def visit_ExpressionList(self, node):
-        base_type = self.visit(node.content[0])
-        for child in node.content:
-            child_type = self.visit(child)
+        # Children are visited once each, nested vectors used to be checked twice per level
+        child_types = [self.visit(child) for child in node.content]
+        base_type = child_types[0]
+        for child_type in child_types:
             if child_type != base_type:
                 self.error(f"Different types of arguments in expression list")
                 return None
@@ -148,7 +245,7 @@ class TypeChecker(NodeVisitor):
         if len(args) != 1:
             self.error("Incorrect arguments.")
             return None
-        size, symbol = args[0].value, self.visit(args[0])
+        size, symbol = args[0].value, args[0].symbol
         if symbol.type != "int":
             self.error("Size must be an integer")
             return None
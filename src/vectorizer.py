@@ -0,0 +1,332 @@
+from copy import deepcopy
+from abraham import Abraham
+from resolver import Resolver
+from visitor import NodeVisitor
+
+# Operators that mean the same thing for scalars and for elementwise numpy arrays.
+# "*" is a matrix product and comparisons would turn accumulators into arrays of bools.
+VECTOR_OPERATORS = {"+", "-", "/", ".+", ".-", ".*", "./"}
+
+SCALAR_OPERATORS = VECTOR_OPERATORS | {"*", "==", "!=", ">", ">=", "<", "<=", "and", "or", "xor"}
+
+# Integers the vectorized body computes must stay below this to fit in int64
+INT64_LIMIT = 2 ** 63
+
+
+def statements(block):
+    return block.content if isinstance(block, Abraham.StatementList) else [block]
+
+def identifiers(node):
+    if isinstance(node, Abraham.Identifier):
+        yield node
+    elif isinstance(node, Abraham.BinOp):
+        yield from identifiers(node.left)
+        yield from identifiers(node.right)
+    elif isinstance(node, Abraham.UnaryOp):
+        yield from identifiers(node.operand)
+    elif isinstance(node, Abraham.ExpressionList):
+        for elem in node.content:
+            yield from identifiers(elem)
+    elif isinstance(node, Abraham.Vector):
+        yield from identifiers(node.content)
+    elif isinstance(node, Abraham.FunctionCall):
+        yield from identifiers(node.arguments)
+
+def names(node):
+    return {identifier.name for identifier in identifiers(node)}
+
+
+# Variables that only ever hold a single number: every assignment to them, anywhere in the
+# program, has a scalar right side
+class ScalarAnalysis(NodeVisitor):
+
+    def __init__(self):
+        self.assignments = []
+        self.iterators = set()
+
+    def analyze(self, root):
+        self.visit(root)
+        scalars = {name for name, _ in self.assignments} | self.iterators
+        changed = True
+        while changed:
+            changed = False
+            for name, value in self.assignments:
+                if name in scalars and not self.is_scalar(value, scalars):
+                    scalars.discard(name)
+                    changed = True
+        return scalars
+
+    def is_scalar(self, node, scalars):
+        if isinstance(node, Abraham.Numericek):
+            return True
+        if isinstance(node, Abraham.Identifier):
+            return node.name in scalars
+        if isinstance(node, Abraham.UnaryOp):
+            return node.operator == "-" and self.is_scalar(node.operand, scalars)
+        if isinstance(node, Abraham.BinOp):
+            if node.operator == "SUBSCRIPT":
+                return all(self.is_scalar(index, scalars) for index in node.right.content)
+            return (node.operator in SCALAR_OPERATORS
+                    and self.is_scalar(node.left, scalars) and self.is_scalar(node.right, scalars))
+        return False
+
+    def visit_AssignStatement(self, node):
+        if isinstance(node.left, Abraham.Identifier):
+            self.assignments.append((node.left.name, node.right))
+
+    def visit_If(self, node):
+        self.visit(node.block)
+        if node.else_block is not None:
+            self.visit(node.else_block)
+
+    def visit_While(self, node):
+        self.visit(node.block)
+
+    def visit_For(self, node):
+        self.iterators.add(node.iterator)
+        self.visit(node.block)
+
+    def generic_visit(self, node):
+        if isinstance(node, Abraham.StatementList):
+            super().generic_visit(node)
+
+
+# Rewrites counted loops whose iterations don't depend on each other into numpy operations,
+# `for (i = a:b) { t = f(i, n); s += g(t); n += c; }` becomes
+# `if (a < b) { i = arange(a:b); t = f(i, n + (i - a) .* c); s += sum(g(t)); n += (b - a) .* c; }`
+# Any other loop is kept. Sums can differ in the last bits, that's why the pass is opt-in.
+class Vectorizer(NodeVisitor):
+
+    def __init__(self):
+        self.depth = 0
+        self.scalars = set()
+        self.vectorized = 0
+
+    def vectorize(self, root):
+        Resolver().resolve(root)
+        self.scalars = ScalarAnalysis().analyze(root)
+        return self.visit(root)
+
+    def visit_StatementList(self, node):
+        node.content = [self.visit(statement) for statement in node.content]
+        return node
+
+    # Only scopes that have a frame count towards the depth of a slot
+    def visit_If(self, node):
+        self.depth += not node.frame.elided
+        node.block = self.visit(node.block)
+        if node.else_block is not None:
+            node.else_block = self.visit(node.else_block)
+        self.depth -= not node.frame.elided
+        return node
+
+    def visit_While(self, node):
+        self.depth += not node.frame.elided
+        node.block = self.visit(node.block)
+        self.depth -= not node.frame.elided
+        return node
+
+    def visit_For(self, node):
+        self.depth += not node.frame.elided
+        node.block = self.visit(node.block)
+        loop = self.rewrite(node)
+        self.depth -= not node.frame.elided
+        if loop is None:
+            return node
+        self.vectorized += 1
+        return loop
+
+    def generic_visit(self, node):
+        return node
+
+    # ====== Loop analysis ======
+
+    def is_local(self, identifier):
+        return identifier.slot is not None and identifier.slot[0] == self.depth
+
+    def is_vectorizable(self, node):
+        if isinstance(node, Abraham.Numericek):
+            return True
+        if isinstance(node, Abraham.Identifier):
+            return node.name in self.scalars
+        if isinstance(node, Abraham.UnaryOp):
+            return node.operator == "-" and self.is_vectorizable(node.operand)
+        if isinstance(node, Abraham.BinOp):
+            return (node.operator in VECTOR_OPERATORS
+                    and self.is_vectorizable(node.left) and self.is_vectorizable(node.right))
+        return False
+
+    def is_integer(self, node):
+        return node.symbol is not None and node.symbol.type == "int"
+
+    def rewrite(self, node):
+        if not isinstance(node.range, Abraham.BinOp) or node.range.operator != ":":
+            return None
+        if node.frame.elided or node.iterator_slot[0] != self.depth:
+            # The iterator lives on after the loop, its last value would be lost
+            return None
+
+        body = statements(node.block)
+        for statement in body:
+            if not isinstance(statement, Abraham.AssignStatement):
+                return None
+            if not isinstance(statement.left, Abraham.Identifier):
+                return None
+            if not self.is_vectorizable(statement.right):
+                return None
+
+        assigned = {statement.left.name for statement in body}
+        bounds = names(node.range)
+        if node.iterator in assigned or bounds & assigned or node.iterator in bounds:
+            return None
+        if not all(self.is_vectorizable(bound) for bound in (node.range.left, node.range.right)):
+            return None
+        # A range runs ceil(b - a) times, only for integer bounds is that the b - a below, and
+        # (i - a) the exact number of steps taken
+        if not all(self.is_integer(bound) for bound in (node.range.left, node.range.right)):
+            return None
+
+        local = {statement.left.name for statement in body if self.is_local(statement.left)}
+        outer = assigned - local
+
+        # Values that change from one iteration to the next
+        varying = {node.iterator} | outer
+        changed = True
+        while changed:
+            changed = False
+            for statement in body:
+                name = statement.left.name
+                if name in local and name not in varying and names(statement.right) & varying:
+                    varying.add(name)
+                    changed = True
+
+        # Loop-local temporaries must be written before they are read in every iteration
+        written = set()
+        for statement in body:
+            reads = names(statement.right)
+            if statement.operator != "=":
+                reads.add(statement.left.name)
+            if (reads & local) - written:
+                return None
+            written.add(statement.left.name)
+
+        inductions = {}
+        reductions = set()
+        for name in outer:
+            updates = [(position, statement) for position, statement in enumerate(body)
+                       if statement.left.name == name]
+            if any(statement.operator not in ("+=", "-=") for _, statement in updates):
+                return None
+            is_read = any(name in names(statement.right) for statement in body)
+            step = names(updates[0][1].right)
+            # The closed form may be needed before any temporary of the iteration is written
+            if len(updates) == 1 and not step & varying and not step & local:
+                inductions[name] = updates[0]
+            elif not is_read and all(names(statement.right) & varying for _, statement in updates):
+                reductions.add(name)
+            else:
+                return None
+
+        return self.emit(node, body, inductions, reductions)
+
+    # ====== Code generation ======
+
+    def emit(self, node, body, inductions, reductions):
+        start, stop = node.range.left, node.range.right
+        iterator = Abraham.Identifier(name=node.iterator)
+
+        def steps(offset):
+            # Number of induction steps taken by the time the statement runs: (i - a) or (i - a + 1)
+            taken = Abraham.BinOp(left=deepcopy(iterator), right=deepcopy(start), operator="-")
+            if offset:
+                taken = Abraham.BinOp(left=taken, right=Abraham.Numericek(value=offset), operator="+")
+            return taken
+
+        def closed_form(name, position):
+            update_position, update = inductions[name]
+            sign = "+" if update.operator == "+=" else "-"
+            offset = 1 if position > update_position else 0
+            step = Abraham.BinOp(left=steps(offset), right=deepcopy(update.right), operator=".*")
+            return Abraham.BinOp(left=Abraham.Identifier(name=name), right=step, operator=sign)
+
+        def substitute(expression, position):
+            if isinstance(expression, Abraham.Identifier) and expression.name in inductions:
+                return closed_form(expression.name, position)
+            if isinstance(expression, Abraham.BinOp):
+                return Abraham.BinOp(
+                    left=substitute(expression.left, position),
+                    right=substitute(expression.right, position),
+                    operator=expression.operator,
+                )
+            if isinstance(expression, Abraham.UnaryOp):
+                return Abraham.UnaryOp(operand=substitute(expression.operand, position), operator=expression.operator)
+            return deepcopy(expression)
+
+        # The bound of every right side, temporaries stand for the bound of their last value
+        bounds = {node.iterator: self.add(self.magnitude(start, bounds={}), self.magnitude(stop, bounds={}))}
+        total = deepcopy(bounds[node.iterator])
+        assignments = []
+        for position, statement in enumerate(body):
+            name = statement.left.name
+            if name in inductions:
+                continue
+            right = substitute(statement.right, position)
+            bound = self.magnitude(right, bounds)
+            if statement.operator != "=" and name in bounds:
+                bound = self.combine(statement.operator.rstrip("="), deepcopy(bounds[name]), bound)
+            if name not in reductions:
+                bounds[name] = bound
+            total = self.add(total, deepcopy(bound))
+            if name in reductions:
+                right = self.call("sum", right)
+            assignments.append(Abraham.AssignStatement(left=Abraham.Identifier(name=name), right=right, operator=statement.operator))
+
+        fits = Abraham.BinOp(left=total, right=Abraham.Numericek(value=INT64_LIMIT), operator="<")
+        arguments = Abraham.ExpressionList(content=[
+            Abraham.BinOp(left=deepcopy(start), right=deepcopy(stop), operator=":"), fits,
+        ])
+        content = [Abraham.AssignStatement(left=deepcopy(iterator), right=self.call("arange", arguments), operator="="),
+                   *assignments]
+
+        count = Abraham.BinOp(left=deepcopy(stop), right=deepcopy(start), operator="-")
+        for name, (_, update) in inductions.items():
+            content.append(Abraham.AssignStatement(
+                left=Abraham.Identifier(name=name),
+                right=Abraham.BinOp(left=deepcopy(count), right=deepcopy(update.right), operator=".*"),
+                operator=update.operator,
+            ))
+
+        return Abraham.If(
+            condition=Abraham.BinOp(left=deepcopy(start), right=deepcopy(stop), operator="<"),
+            block=Abraham.StatementList(content=content),
+            else_block=None,
+        )
+
+    # ====== Magnitudes ======
+    # An expression over operands of magnitude at most m_1, m_2, ... computes nothing larger
+    # than the same expression over m_1, m_2, ... with "+" for "-", which Python ints evaluate
+    # exactly before the loop. Operands count as at least 1, so a product covers its factors.
+    # Floats can't overflow int64, they count as 1.
+
+    def magnitude(self, node, bounds):
+        if isinstance(node, Abraham.Numericek):
+            return Abraham.Numericek(value=max(abs(node.value), 1) if type(node.value) is int else 1)
+        if isinstance(node, Abraham.Identifier):
+            if node.name in bounds:
+                return deepcopy(bounds[node.name])
+            return self.call("magnitude", deepcopy(node))
+        if isinstance(node, Abraham.UnaryOp):
+            return self.magnitude(node.operand, bounds)
+        return self.combine(node.operator, self.magnitude(node.left, bounds), self.magnitude(node.right, bounds))
+
+    def combine(self, operator, left, right):
+        if operator in ("*", ".*"):
+            return Abraham.BinOp(left=left, right=right, operator=".*")
+        # A quotient is a float, only its operands need to fit
+        return self.add(left, right)
+
+    def add(self, left, right):
+        return Abraham.BinOp(left=left, right=right, operator="+")
+
+    def call(self, name, argument):
+        return Abraham.FunctionCall(name=name, arguments=Abraham.ExpressionList(content=[argument]))
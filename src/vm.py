@@ -0,0 +1,132 @@
+import numpy as np
+from memory import is_hidden
+from operators import slices, unshared
+from ranges import Range
+from bytecode import (
+    BytecodeCompiler, disassemble, FUNCTIONS, UNARY_FUNCTIONS, BUILTIN_FUNCTIONS, INSTRUCTION_SIZE,
+    UNARY_BASE, MOVE, JUMP, JUMP_IF_FALSE, JUMP_IF_SET, GET_ITER, FOR_ITER, BUILD_LIST, BUILD_VECTOR, BUILD_MATRIX,
+    CALL, CALL_KERNEL, PRINT, STORE_SUBSCRIPT, STORE_SLICE, STORE_ELEMENT, ENTER, RETURN, HALT,
+)
+
+EXHAUSTED = object()
+
+class VirtualMachine:
+    def __init__(self):
+        self.code = None
+        self.registers = None
+
+    def error(self, message: str) -> None:
+        print(f"RuntimeError: {message}")
+
+    def panic(self, message: str) -> None:
+        self.error(message)
+        exit()
+
+    def compile(self, root):
+        self.code = BytecodeCompiler().compile(root)
+        return self.code
+
+    def disassemble(self, root):
+        print(disassemble(self.compile(root)))
+
+    def interpret(self, root):
+        self.compile(root)
+        scope = self.run()
+        print("\nMemory dump:")
+        self.dump_memory(scope)
+
+    def check_indices(self, matrix, args):
+        shape = matrix.shape
+        for bound, index in zip(shape, args):
+            if type(index) is Range:
+                # A block must lie inside the matrix, numpy would quietly cut it short
+                if index.start < 0 or index.start > index.stop or index.stop > bound:
+                    self.panic("Index out of bounds.")
+            elif index < 0 or index >= bound:
+                self.panic("Index out of bounds.")
+
+    def run(self):
+        code = self.code
+        # The stored instruction stream is a flat array of words. It's decoded once into
+        # tuples because unpacking a tuple is cheaper than four separate array reads.
+        words = code.instructions
+        instructions = [tuple(words[i:i + INSTRUCTION_SIZE]) for i in range(0, len(words), INSTRUCTION_SIZE)]
+        scope_registers = [code.scope_registers(scope) for scope in range(len(code.scopes))]
+        regs = self.registers = list(code.registers)
+
+        functions = FUNCTIONS
+        unary_functions = UNARY_FUNCTIONS
+        builtin_functions = BUILTIN_FUNCTIONS
+        check_indices = self.check_indices
+
+        pc = 0
+        while True:
+            op, a, b, c = instructions[pc]
+            pc += 1
+            if op < UNARY_BASE:
+                regs[a] = functions[op](regs[b], regs[c])
+            elif op == JUMP:
+                pc = a
+            elif op == FOR_ITER:
+                value = next(regs[a], EXHAUSTED)
+                if value is EXHAUSTED:
+                    pc = c
+                else:
+                    regs[b] = value
+            elif op == MOVE:
+                regs[a] = regs[b]
+            elif op == JUMP_IF_FALSE:
+                if not regs[a]:
+                    pc = b
+            elif op == STORE_ELEMENT:
+                # Copy on write, like STORE_SUBSCRIPT below
+                regs[a] = unshared(regs[a])
+                regs[a][*regs[b]] = regs[c]
+            elif op == JUMP_IF_SET:
+                if regs[a] is not None:
+                    pc = b
+            elif op < MOVE:
+                regs[a] = unary_functions[op - UNARY_BASE](regs[b])
+            elif op == GET_ITER:
+                regs[a] = iter(regs[b])
+            elif op == BUILD_LIST:
+                regs[a] = regs[b:b + c]
+            elif op == BUILD_VECTOR:
+                regs[a] = np.array(regs[b:b + c])
+            elif op == BUILD_MATRIX:
+                regs[a] = np.concatenate(regs[b:b + c], axis=0)
+            elif op == CALL:
+                regs[a] = builtin_functions[b](regs[c])
+            elif op == CALL_KERNEL:
+                regs[a] = regs[b](regs[c])
+            elif op == PRINT:
+                print(regs[a])
+            elif op == STORE_SUBSCRIPT:
+                # Copy on write, a shared matrix is replaced by its own copy first
+                regs[a] = unshared(regs[a])
+                args = regs[b]
+                check_indices(regs[a], args)
+                regs[a][*args] = regs[c]
+            elif op == STORE_SLICE:
+                regs[a] = unshared(regs[a])
+                args = regs[b]
+                check_indices(regs[a], args)
+                regs[a][slices(args)] = regs[c]
+            elif op == ENTER:
+                for register in scope_registers[a]:
+                    regs[register] = None
+            elif op == RETURN:
+                return a
+            elif op == HALT:
+                return 0
+
+    def dump_memory(self, scope):
+        chain = []
+        while scope is not None:
+            name, parent, variables = self.code.scopes[scope]
+            chain.append((name, variables))
+            scope = parent
+        for name, variables in reversed(chain):
+            lookup = {variable: self.registers[register] for variable, register in variables
+                      if self.registers[register] is not None and not is_hidden(variable)}
+            print(name, lookup)
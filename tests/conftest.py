@@ -0,0 +1,39 @@
+import sys
+from pathlib import Path
+import pytest
+
+# The modules import each other by their bare names, src/main.py runs them the same way
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from kniaz_jarema import ENGINES, main  # noqa: E402
+import spill  # noqa: E402
+from vm import VirtualMachine  # noqa: E402
+
+@pytest.fixture
+def run(tmp_path, monkeypatch, capsys):
+    # Runs a program like `python src/main.py program.m --engine ENGINE ARGUMENTS...` and
+    # returns the lines it printed. The engine is kept in run.engine, see variables.
+    engines = dict(ENGINES)
+    def run(source, engine="interpreter", *arguments):
+        path = tmp_path / "program.m"
+        path.write_text(source)
+        instance = engines[engine]()
+        monkeypatch.setitem(ENGINES, engine, lambda: instance)
+        # --memory-limit configures the module, undone after the test
+        monkeypatch.setattr(spill, "limit", spill.limit)
+        monkeypatch.setattr(spill, "directory", spill.directory)
+        monkeypatch.setattr(sys, "argv", ["main.py", str(path), "--engine", engine, "--no-cache", *arguments])
+        main()
+        output = capsys.readouterr().out.splitlines()
+        assert "Found 0 syntax errors." in output, "\n".join(output)
+        run.engine = instance
+        return output
+    return run
+
+def variables(engine):
+    # The global variables an engine ended the program with, by name
+    if isinstance(engine, VirtualMachine):
+        _, _, registers = engine.code.scopes[0]
+        return {name: engine.registers[register] for name, register in registers}
+    frame_stack = engine.frame_stack
+    return dict(zip(frame_stack.layouts[0].names, frame_stack.frames[0]))
@@ -0,0 +1,24 @@
+import ast
+from pathlib import Path
+from ast_cache import FRONTEND_MODULES
+
+SOURCES = Path(__file__).resolve().parent.parent / "src"
+
+def imported_modules(module):
+    tree = ast.parse((SOURCES / module).read_text())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            yield from (alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            yield node.module
+
+def test_version_covers_every_frontend_module():
+    # Whatever the parser and the TypeChecker import from src/ shapes the cached AST too
+    pending, seen = ["patryk.py", "type_checker.py"], set()
+    while pending:
+        module = pending.pop()
+        seen.add(module)
+        for name in imported_modules(module):
+            if (SOURCES / f"{name}.py").exists() and f"{name}.py" not in seen:
+                pending.append(f"{name}.py")
+    assert seen <= set(FRONTEND_MODULES)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from conftest import ENGINES, variables
+
+@pytest.fixture(params=[(), ("-O", )], ids=["plain", "optimized"])
+def arguments(request):
+    return request.param
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_block_stores(run, engine, arguments):
+    source = "D = zeros(4);\nD[1:3, 2:4] = 7.0;\nB = ones(2);\nD[0:2, 0:2] = B;\nD[1:3, 2:4] += B;\n"
+    run(source, engine, *arguments)
+    expected = np.zeros((4, 4))
+    expected[0:2, 0:2] = 1.0
+    expected[1:3, 2:4] = 8.0
+    np.testing.assert_array_equal(variables(run.engine)["D"], expected)
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_block_reads(run, engine, arguments):
+    source = "D = zeros(4);\nD[1, 2] = 5.0;\nD[3, 1] = 6.0;\nB = D[1:3, 2:4];\nr = D[1, 0:4];\nc = D[0:4, 1];\n"
+    run(source, engine, *arguments)
+    values = variables(run.engine)
+    np.testing.assert_array_equal(values["B"], [[5.0, 0.0], [0.0, 0.0]])
+    np.testing.assert_array_equal(values["r"], [0.0, 0.0, 5.0, 0.0])
+    np.testing.assert_array_equal(values["c"], [0.0, 0.0, 0.0, 6.0])
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_block_read_and_matrix_are_independent(run, engine, arguments):
+    source = "D = zeros(4);\nB = D[1:3, 1:3];\nB[0, 0] = 3.0;\nD[2, 2] = 4.0;\n"
+    run(source, engine, *arguments)
+    values = variables(run.engine)
+    assert values["D"][1, 1] == 0.0
+    assert values["B"][1, 1] == 0.0
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_moving_block_in_loop(run, engine, arguments):
+    source = "E = zeros(4);\nfor (i = 0:3) {\n    E[i:i + 2, 0:2] += ones(2);\n}\n"
+    run(source, engine, *arguments)
+    np.testing.assert_array_equal(variables(run.engine)["E"][:, 0], [1.0, 2.0, 2.0, 1.0])
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_block_outside_matrix_fails(run, engine, capsys):
+    with pytest.raises(SystemExit):
+        run("D = zeros(4);\nfor (i = 0:4) {\n    D[i:i + 2, 0] = 1.0;\n}\n", engine)
+    assert "RuntimeError: Index out of bounds." in capsys.readouterr().out
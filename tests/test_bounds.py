@@ -0,0 +1,17 @@
+import pytest
+from conftest import ENGINES, variables
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_proved_stores(run, engine):
+    source = "A = zeros(4);\nfor (i = 0:4) {\n    for (j = 1:3) {\n        A[i, j] = 2.0;\n        A[i, j] += 1.0;\n    }\n}\n"
+    run(source, engine, "-O")
+    matrix = variables(run.engine)["A"]
+    assert (matrix[:, 1:3] == 3.0).all()
+    assert (matrix[:, [0, 3]] == 0.0).all()
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_store_out_of_bounds_still_fails(run, engine, capsys):
+    source = "A = zeros(3);\nfor (i = 0:5) {\n    A[i, 0] = 1.0;\n}\n"
+    with pytest.raises(SystemExit):
+        run(source, engine, "-O")
+    assert "RuntimeError: Index out of bounds." in capsys.readouterr().out
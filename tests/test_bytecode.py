@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+from abraham import Abraham
+from bytecode import BytecodeCompiler
+from conftest import ENGINES, variables
+from kniaz_jarema import frontend
+
+def test_matrix_of_rows():
+    # The grammar builds nested vectors, later passes may build a Matrix out of their rows
+    ast = frontend("M = [[1.0, 2.0]];\nN = [[3.0, 4.0]];\n")[0]
+    first, second = ast.content
+    first.right = Abraham.Matrix(rows=[first.right, second.right])
+    for engine in ENGINES.values():
+        engine = engine()
+        engine.interpret(ast)
+        np.testing.assert_array_equal(variables(engine)["M"], [[1.0, 2.0], [3.0, 4.0]])
+
+def test_statement_is_not_an_expression():
+    with pytest.raises(TypeError, match="Control is not an expression"):
+        BytecodeCompiler().expression(Abraham.Control(type="break"))
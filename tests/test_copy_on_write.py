@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from conftest import ENGINES, variables
+import spill
+
+# Large enough that -O doesn't fold ones(SIZE) into a constant, which is copied on every use
+SIZE = 80
+
+@pytest.fixture(params=[(), ("-O", )], ids=["plain", "optimized"])
+def arguments(request):
+    return request.param
+
+@pytest.fixture
+def created(monkeypatch):
+    # Every matrix ones() builds, in order
+    matrices = []
+    def ones(shape):
+        matrix = spill.full(shape, 1.0)
+        matrices.append(matrix)
+        return matrix
+    monkeypatch.setattr(spill, "ones", ones)
+    return matrices
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_store_into_copy_leaves_original(run, engine, arguments):
+    run(f"A = ones({SIZE});\nB = A;\nB[1, 1] = 5.0;\n", engine, *arguments)
+    values = variables(run.engine)
+    assert values["A"][1, 1] == 1.0
+    assert values["B"][1, 1] == 5.0
+    assert not np.shares_memory(values["A"], values["B"])
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_store_into_original_leaves_copy(run, engine, arguments):
+    run(f"A = ones({SIZE});\nB = A;\nA[2, 3] = 5.0;\nA[2, 3] += 1.0;\n", engine, *arguments)
+    values = variables(run.engine)
+    assert values["A"][2, 3] == 6.0
+    assert values["B"][2, 3] == 1.0
+    assert not np.shares_memory(values["A"], values["B"])
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_compound_assignment_to_copy_leaves_original(run, engine, arguments):
+    run(f"A = ones({SIZE});\nB = A;\nB += ones({SIZE});\n", engine, *arguments)
+    values = variables(run.engine)
+    assert (values["A"] == 1.0).all()
+    assert (values["B"] == 2.0).all()
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_shared_copy_in_loop_is_made_once(run, engine, arguments):
+    source = f"A = ones({SIZE});\nB = A;\nfor (i = 0:{SIZE}) {{\n    B[i, i] = 0.0;\n}}\n"
+    run(source, engine, *arguments)
+    values = variables(run.engine)
+    assert (np.diagonal(values["A"]) == 1.0).all()
+    assert (np.diagonal(values["B"]) == 0.0).all()
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_reads_share_without_copying(run, engine, arguments, created):
+    run(f"A = ones({SIZE});\nB = A;\nC = B;\nx = B[1, 1];\ny = C[2, 2];\n", engine, *arguments)
+    values = variables(run.engine)
+    assert len(created) == 1
+    assert values["A"] is created[0]
+    assert values["B"] is created[0]
+    assert values["C"] is created[0]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_unshared_matrix_is_updated_in_place(run, engine, arguments, created):
+    source = (f"A = ones({SIZE});\nA[1, 1] = 2.0;\nA += ones({SIZE});\nA[2, 2] += 1.0;\n"
+              f"for (i = 0:{SIZE}) {{\n    A[i, 0] = 7.0;\n}}\n")
+    run(source, engine, *arguments)
+    values = variables(run.engine)
+    # Still the buffer the first ones() built, no store or update copied it
+    assert values["A"] is created[0]
+    assert values["A"][1, 1] == 3.0
+    assert values["A"][2, 2] == 3.0
+    assert (values["A"][:, 0] == 7.0).all()
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_shared_matrix_stays_shared(run, engine, arguments, created):
+    run(f"A = ones({SIZE});\nB = A;\nA = ones({SIZE});\nB[1, 1] = 2.0;\nB[2, 2] = 3.0;\n", engine, *arguments)
+    values = variables(run.engine)
+    # Sharing isn't undone when A lets go, B copies on its first store and keeps the copy
+    assert values["B"] is not created[0]
+    assert (values["B"][1, 1], values["B"][2, 2]) == (2.0, 3.0)
+    assert (created[0] == 1.0).all()
+    assert values["A"] is created[1]
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("view", ["A[0:2, 0:2]", "A'"])
+def test_store_into_original_leaves_view(run, engine, arguments, view):
+    run(f"A = ones({SIZE});\nB = {view};\nA[0, 1] = 5.0;\nA += ones({SIZE});\n", engine, *arguments)
+    values = variables(run.engine)
+    assert (values["B"] == 1.0).all()
+    assert values["A"][0, 1] == 6.0
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_rows_iterated_over_are_left_alone(run, engine, arguments):
+    source = f"A = ones({SIZE});\nx = 0;\nfor (r = A) {{\n    A[1, 0] = 5.0;\n    x = r;\n}}\n"
+    run(source, engine, *arguments)
+    values = variables(run.engine)
+    assert values["A"][1, 0] == 5.0
+    assert (values["x"] == 1.0).all()
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from conftest import ENGINES, variables
+from diagonal import Diagonal
+
+def assert_same(result, expected):
+    # Bit for bit, the sign of every zero included
+    result = np.asarray(result)
+    assert result.dtype == expected.dtype
+    assert np.array_equal(result, expected) and (np.signbit(result) == np.signbit(expected)).all()
+
+@pytest.fixture
+def matrix():
+    return np.arange(16.0).reshape(4, 4) - 5.0
+
+@pytest.mark.parametrize("scale", [1.0, -2.5, 0.0])
+def test_products_scale_the_other_side(matrix, scale):
+    diagonal, dense = Diagonal(4, scale), np.diag(np.full(4, scale))
+    assert_same(diagonal @ matrix, dense @ matrix)
+    assert_same(matrix @ diagonal, matrix @ dense)
+    assert_same(diagonal @ matrix[0], dense @ matrix[0])
+    product = diagonal @ Diagonal(4, 3.0)
+    assert type(product) is Diagonal
+    assert_same(product, dense @ np.diag(np.full(4, 3.0)))
+
+@pytest.mark.parametrize("operation", [
+    lambda a, b: a * 3.0, lambda a, b: a / 2.0, lambda a, b: a + b, lambda a, b: b - a,
+    lambda a, b: a * b, lambda a, b: a + 1.0, lambda a, b: -a,
+])
+def test_elementwise_matches_dense(matrix, operation):
+    assert_same(operation(Diagonal(4, 2.0), matrix), operation(np.eye(4) * 2.0, matrix))
+
+def test_elementwise_stays_diagonal_while_zeros_stay_zero():
+    assert type(Diagonal(4) * 3.0) is Diagonal
+    assert type(Diagonal(4) + Diagonal(4, 2.0)) is Diagonal
+    assert type(Diagonal(4) + 1.0) is np.ndarray
+    # -eye(n) has -0.0 off the diagonal, which a Diagonal can't represent
+    assert type(-Diagonal(4)) is np.ndarray
+
+def test_in_place_add_touches_the_diagonal(matrix):
+    expected = matrix + np.eye(4)
+    result = matrix
+    result += Diagonal(4)
+    assert result is matrix
+    assert_same(result, expected)
+
+def test_transpose_and_reads(matrix):
+    diagonal = Diagonal(4, 2.0)
+    assert np.transpose(diagonal) is diagonal
+    assert str(diagonal) == str(np.eye(4) * 2.0)
+    with pytest.raises(ValueError):
+        diagonal.view()[0, 0] = 1.0
+
+@pytest.mark.parametrize("scale", [1.0, -2.5, -0.0])
+def test_elements_match_dense(scale):
+    matrix = Diagonal(4, scale)
+    dense = np.diag(np.full(4, scale))
+    for row in range(-4, 4):
+        for column in range(-4, 4):
+            element = matrix[row, column]
+            assert type(element) is np.float64
+            assert element == dense[row, column] and np.signbit(element) == np.signbit(dense[row, column])
+    assert (matrix[1:3, 2] == dense[1:3, 2]).all()
+    with pytest.raises(IndexError, match="out of bounds for axis 1 with size 4"):
+        matrix[0, 4]
+
+@pytest.fixture(params=[(), ("-O", )], ids=["plain", "optimized"])
+def arguments(request):
+    return request.param
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_eye_in_programs(run, engine, arguments):
+    source = ("I = eye(50);\nA = ones(50);\nA[0, 1] = 2.0;\nP = A * I;\nQ = I' * A;\nS = I .* 3.0;\n"
+              "T = A .+ I;\nA += I;\nD = I;\nD[1, 3] = 2.0;\n")
+    run(source, engine, *arguments)
+    values = variables(run.engine)
+    dense = np.ones((50, 50))
+    dense[0, 1] = 2.0
+    assert type(values["I"]) is Diagonal and type(values["S"]) is Diagonal
+    assert_same(values["P"], dense)
+    assert_same(values["Q"], dense)
+    assert_same(values["S"], np.eye(50) * 3.0)
+    assert_same(values["T"], dense + np.eye(50))
+    assert_same(values["A"], dense + np.eye(50))
+    # A store makes the variable its own dense matrix, the eye() it came from stays
+    assert type(values["D"]) is np.ndarray and values["D"][1, 3] == 2.0
+    assert values["I"][1, 3] == 0.0
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_element_reads_in_a_loop(run, engine):
+    source = "I = eye(6);\ns = 0.0;\nfor (i = 0:6) {\n    for (j = 0:6) {\n        s += I[i, j] .* 2.0;\n    }\n}\n"
+    run(source, engine)
+    values = variables(run.engine)
+    assert type(values["I"]) is Diagonal
+    assert values["s"] == 12.0
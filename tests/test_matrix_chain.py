@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from conftest import ENGINES, variables
+from abraham import Abraham
+from kniaz_jarema import frontend
+from matrix_chain import MatrixChains
+
+CHAINS = """
+M = ones(3);
+M[0, 1] = 2.0;
+N = eye(3);
+v = [1.0, 2.0, 3.0];
+w = M * N * M * v;
+u = v' * M * eye(3) * M;
+E = eye(3) * M * eye(3);
+F = eye(3) * eye(3);
+G = M * (M * M) * eye(3);
+"""
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("arguments", [(), ("-O", )], ids=["plain", "optimized"])
+def test_reordered_products_keep_their_values(run, engine, arguments):
+    run(CHAINS, engine, "--reorder-products", *arguments)
+    values = variables(run.engine)
+    M, v = np.ones((3, 3)), np.array([1.0, 2.0, 3.0])
+    M[0, 1] = 2.0
+    np.testing.assert_allclose(values["w"], M @ M @ v)
+    np.testing.assert_allclose(values["u"], v @ M @ M)
+    np.testing.assert_allclose(values["E"], M)
+    np.testing.assert_allclose(values["F"], np.eye(3))
+    np.testing.assert_allclose(values["G"], M @ M @ M)
+
+def reordered(source):
+    ast, _ = frontend(source)
+    return MatrixChains().reorder(ast).content[-1].right
+
+def test_vector_is_multiplied_first():
+    chain = reordered("M = ones(3);\nv = [1.0, 2.0, 3.0];\nw = M * M * v;\n")
+    assert isinstance(chain.left, Abraham.Identifier)
+    assert chain.right.operator == "*" and chain.right.right.name == "v"
+
+def test_identities_are_dropped():
+    chain = reordered("M = ones(3);\nN = ones(3);\nE = eye(3) * M * eye(3) * N;\n")
+    assert chain.left.name == "M" and chain.right.name == "N"
+
+def test_chain_of_identities_keeps_one():
+    chain = reordered("F = eye(3) * eye(3);\n")
+    assert isinstance(chain, Abraham.FunctionCall) and chain.name == "eye"
+
+def test_chain_that_saves_nothing_is_kept():
+    chain = reordered("M = ones(3);\nN = ones(3);\nP = (M * N) * M;\n")
+    assert chain.left.operator == "*" and chain.right.name == "M"
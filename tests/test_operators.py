@@ -0,0 +1,24 @@
+import math
+import pytest
+from conftest import ENGINES, variables
+from operators import divide
+
+def test_divide_by_zero_follows_ieee():
+    assert divide(7, 2) == 3.5
+    with pytest.warns(RuntimeWarning):
+        assert math.isnan(divide(0.0, 0.0))
+    with pytest.warns(RuntimeWarning):
+        assert divide(-1.0, 0.0) == -math.inf
+    with pytest.warns(RuntimeWarning):
+        assert divide(1, 0) == math.inf
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("arguments", [(), ("-O", )], ids=["plain", "optimized"])
+def test_dividing_matrix_elements_by_zero(run, engine, arguments):
+    source = "A = zeros(2);\nx = A[0, 0];\nz = A[1, 1];\ny = x / z;\nw = 1.0 ./ z;\nv = 2.0;\nv /= z;\nA[0, 1] /= z;\n"
+    with pytest.warns(RuntimeWarning):
+        run(source, engine, *arguments)
+    values = variables(run.engine)
+    assert math.isnan(values["y"])
+    assert values["w"] == math.inf and values["v"] == math.inf
+    assert math.isnan(values["A"][0, 1])
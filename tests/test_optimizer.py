@@ -0,0 +1,182 @@
+from pathlib import Path
+import pytest
+from code_motion import CodeMotion
+from conftest import ENGINES, variables
+from kniaz_jarema import frontend
+from optimizer import Optimizer
+
+RESOURCES = Path(__file__).resolve().parent.parent / "resources"
+# The other examples only show off the syntax, they don't type check
+PROGRAMS = [RESOURCES / "examples" / name for name in ("example3.m", "testcase.m")] + [
+    RESOURCES / "programs" / name
+    for name in ("example.m", "fibonacci.m", "matrix.m", "pi.m", "primes.m", "sqrt.m", "triangle.m")
+]
+
+# Folding, dead branches, unreachable statements, code motion and fusion, -O must not change
+# what a program prints
+SNIPPETS = {
+    "folding": """
+x = 2 .* 3 + 1;
+y = -(x - 10) .* 2;
+z = 7 / 2;
+A = ones(3) .+ eye(3) .- -ones(3);
+print(x);
+print(y);
+print(z);
+print(A);
+""",
+    "constant_matrix_is_copied": """
+for (i = 0:3) {
+    A = zeros(2) .+ ones(2);
+    A[0, 0] += 1.5;
+    print(A);
+}
+""",
+    "dead_branches": """
+x = 1;
+if (1 > 2) {
+    x = 2;
+} else {
+    x = 3;
+}
+if (2 > 1) {
+    y = 4;
+    print(y);
+}
+while (1 > 2) {
+    x = 5;
+}
+print(x);
+""",
+    "unreachable": """
+s = 0;
+for (i = 0:10) {
+    if (i == 3) {
+        continue;
+        s += 100;
+    }
+    if (i > 6) {
+        break;
+        s += 1000;
+    }
+    s += i;
+}
+print(s);
+if (s > 0) {
+    return 0;
+    s = -1;
+}
+print(s);
+""",
+    "invariant_products": """
+A = ones(3);
+B = eye(3);
+n = 3.0;
+s = 0.0;
+for (i = 0:4) {
+    C = A * B;
+    s += C[0, 0];
+    t = (n + 2.0) .* (n + 2.0);
+    s += t;
+}
+print(s);
+z = 0.0;
+for (i = 1:0) {
+    z = 1.0 / (n - 3.0);
+}
+print(z);
+""",
+    "invariant_of_a_changing_matrix": """
+A = ones(3);
+B = A;
+s = 0.0;
+for (i = 0:3) {
+    C = A * B;
+    s += C[1, 1];
+    B[i, i] = 2.0;
+}
+print(s);
+""",
+    "common_subexpressions": """
+a = 1.0;
+b = 2.0;
+c = (a + b) .* (a + b);
+a = 5.0;
+d = (a + b) .* (a + b);
+print(c);
+print(d);
+""",
+    # An if opens its scope before the condition, only the later conditions read the kept value
+    "common_subexpressions_in_conditions": """
+a = 2;
+b = 3;
+if (a .* b > 1) {
+    print(a);
+}
+x = a .* b;
+y = a .* b;
+if (a .* b > 2) {
+    print(b);
+}
+print(x);
+print(y);
+""",
+    "fused_chains": """
+A = ones(4);
+B = eye(4);
+C = zeros(4);
+C[0, 1] = 3.5;
+D = A .+ B;
+E = A .* B .+ C .- D;
+F = -(A .* B) ./ (C .+ D);
+G = zeros(4);
+for (i = 0:3) {
+    A = A .+ B .* A;
+    C[i, i] = 2.0;
+    G = (A + B) - (C .* D) .+ -E;
+}
+x = E[0, 1];
+print(x);
+y = F[0, 1];
+print(y);
+z = G[1, 1];
+print(z);
+w = A[2, 2];
+print(w);
+""",
+    "fused_in_blocks_of_rows": """
+A = ones(300);
+B = eye(300);
+C = zeros(300);
+C[0, 1] = 3.5;
+C[299, 298] = -1.5;
+E = A .* B .+ C .- (A .+ B);
+x = E[0, 1];
+print(x);
+y = E[299, 298];
+print(y);
+z = E[150, 150];
+print(z);
+""",
+}
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("program", PROGRAMS, ids=lambda path: f"{path.parent.name}/{path.name}")
+def test_programs_print_the_same(run, engine, program):
+    source = program.read_text()
+    assert run(source, engine, "-O") == run(source, engine)
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("name", SNIPPETS)
+def test_snippets_print_the_same(run, engine, name):
+    assert run(SNIPPETS[name], engine, "-O") == run(SNIPPETS[name], engine)
+
+def test_common_subexpressions_report_the_uses_they_replace():
+    optimizer = Optimizer()
+    CodeMotion(optimizer).optimize(optimizer.optimize(frontend(SNIPPETS["common_subexpressions_in_conditions"])[0]))
+    assert [message for _, message in optimizer.changes] == ["computed (a .* b) once for 3 uses"]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_folded_matrix_is_not_shared(run, engine):
+    run("A = ones(2) .+ eye(2);\nB = ones(2) .+ eye(2);\nA[0, 0] = 5.0;\n", engine, "-O")
+    assert variables(run.engine)["B"][0, 0] == 2.0
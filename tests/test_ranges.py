@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from conftest import ENGINES, variables
+from ranges import Range
+
+def test_elements_and_slices_come_from_the_bounds():
+    values = Range(3, 10)
+    assert len(values) == 7 and values.shape == (7, )
+    assert values[0] == 3 and values[-1] == 9 and values[(2, )] == 5
+    part = values[1:4]
+    assert type(part) is Range and (part.start, part.stop) == (4, 7)
+    assert list(Range(2.5, 5)) == [2.5, 3.5, 4.5]
+    assert len(Range(5, 2)) == 0
+
+def test_arithmetic_materializes_as_arange():
+    np.testing.assert_array_equal(Range(0, 4) * 2, [0, 2, 4, 6])
+    assert np.asarray(Range(0, 4)).dtype == np.int64
+    assert np.asarray(Range(0.5, 3)).dtype == np.float64
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_range_values(run, engine):
+    run("n = 6;\nd = (0:n) .* 3;\nr = 2:5;\nx = r[1];\nr[0] = 7;\ns = 0;\nfor (i = 1:n) {\n    s += i;\n}\n", engine)
+    values = variables(run.engine)
+    np.testing.assert_array_equal(values["d"], [0, 3, 6, 9, 12, 15])
+    assert values["x"] == 3
+    np.testing.assert_array_equal(values["r"], [7, 3, 4])
+    assert values["s"] == 15
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_range_prints_as_before(run, engine):
+    assert "range(0, 4)" in run("r = 0:4;\nprint(r);\n", engine)
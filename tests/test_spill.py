@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from conftest import ENGINES, variables
+from kniaz_jarema import memory_size
+import spill
+from spill import Spilled
+
+@pytest.fixture
+def limited(monkeypatch, tmp_path):
+    # 1K: a 20x20 float64 matrix is 3200 bytes and spills, blocks are 2 rows of it
+    monkeypatch.setattr(spill, "limit", spill.limit)
+    monkeypatch.setattr(spill, "directory", spill.directory)
+    spill.configure(1024, str(tmp_path))
+    return tmp_path
+
+def test_memory_sizes():
+    assert memory_size("4096") == 4096
+    assert memory_size("32M") == 32 << 20
+    assert memory_size("1.5k") == 1536
+    assert memory_size("2G") == 2 << 30
+
+def test_only_matrices_over_the_limit_spill(limited):
+    assert type(spill.ones((20, 20))) is Spilled
+    assert type(spill.zeros((2, 2))) is np.ndarray
+    assert (spill.full((20, 20), -0.0) == 0.0).all() and np.signbit(spill.full((20, 20), -0.0)).all()
+    assert not list(limited.glob("*.matrix"))
+
+def test_blockwise_operations_match_dense(limited):
+    dense = np.arange(400.0).reshape(20, 20) / 7.0
+    matrix = spill.empty((20, 20))
+    matrix[...] = dense
+    assert np.array_equal(np.asarray(matrix * 2.0 + matrix), dense * 2.0 + dense)
+    assert np.array_equal(np.asarray(-matrix), -dense)
+    # BLAS may sum a block of rows in another order than the whole matrix
+    for result in (matrix @ dense, dense @ matrix):
+        assert type(result) is Spilled
+        np.testing.assert_allclose(np.asarray(result), dense @ dense, rtol=1e-14)
+    np.testing.assert_allclose(matrix @ dense[0], dense @ dense[0], rtol=1e-14)
+    # Small reads come back as ordinary arrays
+    assert type(matrix[1:3]) is np.ndarray
+
+def test_copy_goes_to_a_new_file(limited):
+    matrix = spill.ones((20, 20))
+    copy = spill.copy(matrix)
+    assert type(copy) is Spilled and spill.owns(copy)
+    assert not np.shares_memory(matrix, copy) and (copy == 1.0).all()
+
+@pytest.fixture(params=[(), ("-O", )], ids=["plain", "optimized"])
+def arguments(request):
+    return request.param
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_matrices_over_the_limit_stay_in_files(run, engine, arguments, tmp_path):
+    # Under -O ones(20) is folded into a constant, every use copies it into a file again
+    source = "A = ones(20);\nB = A .+ 1.0;\nB[1, 1] = 5.0;\nC = zeros(2);\n"
+    run(source, engine, *arguments, "--memory-limit", "1K", "--scratch-dir", str(tmp_path))
+    values = variables(run.engine)
+    for name in "AB":
+        assert type(values[name]) is Spilled and spill.owns(values[name])
+    assert type(values["C"]) is np.ndarray
+    assert (values["A"] == 1.0).all()
+    assert values["B"][1, 1] == 5.0 and values["B"].sum() == 2.0 * 400 + 3.0
+    # The files are unlinked as soon as they're mapped
+    assert not list(tmp_path.glob("*.matrix"))
+
+PROGRAM = """
+A = ones(20);
+B = eye(20);
+C = zeros(20);
+C[0, 1] = 3.5;
+D = A * (B .* 2.0) + C;
+E = D';
+E[3, 3] += 1.0;
+s = 0.0;
+for (i = 0:20) {
+    s += D[i, i];
+    s += E[i, 0];
+}
+print(s);
+print(D);
+print(E);
+"""
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_programs_print_the_same(run, engine, arguments, tmp_path):
+    limited = run(PROGRAM, engine, *arguments, "--memory-limit", "1K", "--scratch-dir", str(tmp_path))
+    assert limited == run(PROGRAM, engine, *arguments)
@@ -0,0 +1,31 @@
+import pytest
+from conftest import ENGINES
+from abraham import Abraham
+from kniaz_jarema import frontend
+
+ELSE_BRANCH = """
+x = 1;
+if (x > 2) {
+    v = 0;
+} else {
+    v = (1 - (1 * (4 .* 3)));
+    print(v);
+}
+"""
+
+def test_else_branch_nodes_keep_their_symbol():
+    ast, _ = frontend(ELSE_BRANCH)
+    branch = ast.content[1].else_block
+    product = branch.content[0].right.right
+    assert product.operator == "*"
+    assert product.symbol.type == "int" and product.symbol.shape == (1, )
+
+def test_else_branch_names_are_not_declared_in_the_if_branch(capsys):
+    ast, _ = frontend("x = 1;\nif (x > 2) {\n    v = 0;\n} else {\n    w = v;\n}\n")
+    assert ast is None
+    assert "SyntaxError: Unknown identifier v" in capsys.readouterr().out
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("arguments", [(), ("-O", )])
+def test_scalar_product_in_else_branch(run, engine, arguments):
+    assert "-11" in run(ELSE_BRANCH, engine, *arguments)
@@ -0,0 +1,36 @@
+import pytest
+from conftest import ENGINES, variables
+from kniaz_jarema import frontend
+from vectorizer import Vectorizer
+
+FLOAT_BOUNDS = "n = 0.0;\nfor (i = 0.5:3.0) {\n    n += 1.0;\n}\n"
+INTEGER_BOUNDS = "n = 0.0;\ns = 0;\nfor (i = 2:7) {\n    n += 1.0;\n    s += i .* 2;\n}\n"
+
+def vectorized(source):
+    vectorizer = Vectorizer()
+    vectorizer.vectorize(frontend(source)[0])
+    return vectorizer.vectorized
+
+def test_loop_with_float_bounds_is_kept():
+    # 0.5:3.0 runs ceil(2.5) = 3 times, not 3.0 - 0.5
+    assert vectorized(FLOAT_BOUNDS) == 0
+    assert vectorized(INTEGER_BOUNDS) == 1
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("source, expected", [(FLOAT_BOUNDS, {"n": 3.0}), (INTEGER_BOUNDS, {"n": 5.0, "s": 40})])
+def test_vectorized_loop_runs_as_often_as_the_loop(run, engine, source, expected):
+    run(source, engine, "--vectorize")
+    values = variables(run.engine)
+    assert {name: values[name] for name in expected} == expected
+
+# Every element fits in int64, the sum doesn't
+LARGE_SUM = "s = 0;\nfor (i = 0:4) {\n    s += i + 4611686018427387904;\n}\n"
+# The elements themselves don't fit in int64
+LARGE_ELEMENTS = "s = 0;\nfor (i = 0:10) {\n    s += i .* 2000000000000000000;\n}\n"
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("source, expected", [(LARGE_SUM, 18446744073709551622), (LARGE_ELEMENTS, 90000000000000000000)])
+def test_vectorized_integers_dont_overflow(run, engine, source, expected):
+    assert vectorized(source) == 1
+    run(source, engine, "--vectorize")
+    assert variables(run.engine)["s"] == expected